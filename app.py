@@ -1,15 +1,19 @@
-from flask import Flask, render_template, request, jsonify, session, send_from_directory
+from flask import Flask, render_template, request, jsonify, session, send_from_directory, make_response, Response
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
 import time
 import logging
 import secrets
-from config.logging_config import setup_logging, user_query_logger
-from services.mta_service import MTAService
-from services.elevator_service import ElevatorEscalatorService
-from services.gemini_service_langchain import GeminiServiceLangChain
-from services.mta_tools import mta_tools
+from pathlib import Path
+from functools import wraps, lru_cache
+from datetime import timedelta
+from langchain_core.globals import set_llm_cache
+from langchain_core.caches import InMemoryCache
+from config.logging_config import setup_logging
+from config.redis_config import get_redis_client
+from utils.json_provider import ORJSONProvider
+from services.mta_service import get_mta_service
 
 # Load environment variables
 load_dotenv()
@@ -18,6 +22,16 @@ load_dotenv()
 setup_logging()
 logger = logging.getLogger(__name__)
 
+# LLM response cache - identical prompts skip the Gemini round trip
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', 3600))
+redis_client = get_redis_client()
+if redis_client is not None:
+    from langchain_community.cache import RedisCache
+    set_llm_cache(RedisCache(redis_client, ttl=LLM_CACHE_TTL))
+    logger.info("LLM cache: Redis")
+else:
+    set_llm_cache(InMemoryCache(maxsize=1000))
+    logger.info("LLM cache: in-memory")
 
 # Determine environment
 IS_PRODUCTION = os.getenv('FLASK_ENV') == 'production'
@@ -33,19 +47,74 @@ else:
     # In development, use default folders
     app = Flask(__name__)
 
-app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(16))
+app.json = ORJSONProvider(app)
+
+app.secret_key = os.getenv('SECRET_KEY')
+if not app.secret_key:
+    # Cookie sessions signed with a random key are lost on every restart
+    logger.warning("SECRET_KEY not set - using a temporary key for this process")
+    app.secret_key = secrets.token_hex(16)
+
+# Server-side sessions in Redis when available (expire after 1 hour)
+if redis_client is not None:
+    from flask_session import Session
+    app.config.update(
+        SESSION_TYPE='redis',
+        SESSION_REDIS=redis_client,
+        SESSION_PERMANENT=False,
+        PERMANENT_SESSION_LIFETIME=timedelta(hours=1)
+    )
+    Session(app)
+
 CORS(app)
 
+
+def cached_json(ttl):
+    """
+    Cache successful JSON responses in Redis for `ttl` seconds,
+    keyed on the request path and query args. No-op without Redis.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if redis_client is None:
+                return view(*args, **kwargs)
+
+            key = f"api-cache:{request.path}?{sorted(request.args.items(multi=True))}"
+            try:
+                cached = redis_client.get(key)
+                if cached is not None:
+                    return Response(cached, mimetype='application/json')
+            except Exception as e:
+                logger.warning(f"Response cache read failed: {e}")
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                try:
+                    redis_client.setex(key, ttl, response.get_data())
+                except Exception as e:
+                    logger.warning(f"Response cache write failed: {e}")
+            return response
+        return wrapper
+    return decorator
+
+
 # Catch-all route for React Router (only in production)
 if IS_PRODUCTION:
+    # Files in the Vite build, collected once so requests don't hit the filesystem
+    FRONTEND_DIST = Path(app.root_path) / 'frontend_dist'
+    FRONTEND_FILES = frozenset(
+        p.relative_to(FRONTEND_DIST).as_posix()
+        for p in FRONTEND_DIST.rglob('*') if p.is_file()
+    )
+    
     @app.route('/<path:path>')
     def catch_all(path):
         # Allow API calls to pass through
         if path.startswith('api/'):
             return jsonify({'error': 'Not found'}), 404
         # Serve static files if they exist (e.g. images in public folder)
-        # Check root of frontend_dist
-        if os.path.exists(os.path.join(app.root_path, 'frontend_dist', path)):
+        if path in FRONTEND_FILES:
             return send_from_directory('frontend_dist', path)
             
         # Otherwise serve index.html
@@ -55,22 +124,38 @@ logger.info("="*60)
 logger.info("NYC Transit Chatbot (LangChain Edition) starting up...")
 logger.info("="*60)
 
-# Initialize services with LangChain
+GEMINI_MODEL = 'models/gemini-2.5-flash'  # or 'gemini-1.5-pro' for more advanced
+
+# Initialize services
 try:
-    mta_service = MTAService()
-    elevator_service = ElevatorEscalatorService()
-    
-    # Use LangChain-based Gemini service
-    gemini_service = GeminiServiceLangChain(
-        api_key=os.getenv('GEMINI_API_KEY'),
-        model='models/gemini-2.5-flash'  # or 'gemini-1.5-pro' for more advanced
-    )
+    mta_service = get_mta_service()
     
     logger.info("All services initialized successfully (using LangChain)")
 except Exception as e:
     logger.error(f"Failed to initialize services: {str(e)}", exc_info=True)
     raise
 
+
+@lru_cache(maxsize=None)
+def get_gemini_service():
+    """
+    LangChain-based Gemini service, built on first use
+    Keeps LangChain/Gemini client imports out of startup (and out of the
+    gunicorn master before fork)
+    """
+    from services.gemini_service_langchain import GeminiServiceLangChain
+    return GeminiServiceLangChain(
+        api_key=os.getenv('GEMINI_API_KEY'),
+        model=GEMINI_MODEL,
+        default_tools=get_mta_tools()
+    )
+
+
+def get_mta_tools():
+    """LangChain tools for the chat agent, imported on first use"""
+    from services.mta_tools import mta_tools
+    return mta_tools
+
 @app.route('/')
 def index():
     """Render the chat interface"""
@@ -81,8 +166,6 @@ def index():
     
     return render_template('index.html')
 
-from services.mta_tools import mta_tools  # Add this import
-
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Handle chat requests with LangChain tools"""
@@ -98,9 +181,9 @@ def chat():
             return jsonify({'error': 'No message provided'}), 400
         
         # NEW: Use tools approach - AI decides which APIs to call
-        response = gemini_service.generate_response_with_tools(
+        response = get_gemini_service().generate_response_with_tools(
             user_query=user_query,
-            tools=mta_tools,
+            tools=get_mta_tools(),
             session_id=session_id
         )
         
@@ -117,11 +200,44 @@ def chat():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the chat response as Server-Sent Events"""
+    user_query = (request.get_json(silent=True) or {}).get('message', '')
+    session_id = session.get('session_id', 'default')
+    
+    logger.info(f"Streaming chat request (session: {session_id}): '{user_query}'")
+    
+    if not user_query:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    gemini_service = get_gemini_service()
+    tools = get_mta_tools()
+    
+    def generate():
+        for chunk in gemini_service.generate_response_with_tools_stream(
+            user_query=user_query,
+            tools=tools,
+            session_id=session_id
+        ):
+            yield f"data: {app.json.dumps({'text': chunk})}\n\n"
+        yield "data: [DONE]\n\n"
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Don't let proxies buffer the stream
+        }
+    )
+
+
 @app.route('/api/clear-history', methods=['POST'])
 def clear_history():
     """Clear conversation history for current session"""
     session_id = session.get('session_id', 'default')
-    gemini_service.clear_history(session_id)
+    get_gemini_service().clear_history(session_id)
     logger.info(f"History cleared for session: {session_id}")
     return jsonify({'message': 'Conversation history cleared'})
 
@@ -129,36 +245,34 @@ def clear_history():
 def get_history():
     """Get conversation history for current session"""
     session_id = session.get('session_id', 'default')
-    history = gemini_service.get_history(session_id)
+    history = get_gemini_service().get_history(session_id)
     
     # Convert to serializable format
     history_list = [
-        {
-            'role': 'human' if isinstance(msg, type(history[0])) and 'Human' in str(type(msg)) else 'ai',
-            'content': msg.content
-        }
-        for msg in history
+        {'role': role, 'content': content}
+        for role, content in history
     ]
     
     return jsonify({'history': history_list, 'session_id': session_id})
 
 @app.route('/api/stations', methods=['GET'])
+@cached_json(ttl=3600)
 def get_stations():
     """Get stations, optionally filtered by line"""
     try:
         line = request.args.get('line')
-        stations = mta_service.stations
-        
         if line:
-            line = line.upper()
-            stations = [s for s in stations if line in s.get('routes', [])]
-            
+            stations = mta_service.stations_by_route.get(line.upper(), [])
+        else:
+            stations = mta_service.stations
+
         return jsonify({'stations': stations, 'count': len(stations)})
     except Exception as e:
         logger.error(f"Error fetching stations: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/alerts', methods=['GET'])
+@cached_json(ttl=60)
 def get_alerts():
     """Get service alerts"""
     try:
@@ -192,6 +306,7 @@ def get_elevator_status():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/arrivals', methods=['GET'])
+@cached_json(ttl=20)
 def get_arrivals():
     """Get arrivals for a station"""
     try:
@@ -213,6 +328,7 @@ def get_arrivals():
 
 
 @app.route('/api/live-trains', methods=['GET'])
+@cached_json(ttl=15)
 def get_live_trains():
     """Get live train positions"""
     try:
@@ -230,10 +346,11 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'service': 'langchain',
-        'model': gemini_service.model_name
+        'model': GEMINI_MODEL
     })
 
-if __name__ == '__main__':
+if __name__ == '__main__' and not IS_PRODUCTION:
+    # Development server only - production runs under gunicorn (gunicorn.conf.py)
     port = int(os.getenv('PORT', 5000))
     logger.info(f"Starting Flask app (LangChain) on port {port}")
     app.run(debug=True, host='0.0.0.0', port=port)
@@ -0,0 +1,18 @@
+import requests
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+
+
+@lru_cache(maxsize=None)
+def get_http_session():
+    """
+    Shared requests session for all MTA/transit API calls
+    One keep-alive connection pool per process, sized for the gthread workers
+    """
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=50))
+    session.headers.update({
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive'
+    })
+    return session
@@ -1,8 +1,74 @@
+import atexit
 import logging
 import os
+import queue
 from datetime import datetime
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
-import json
+from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler, QueueHandler, QueueListener
+import orjson
+
+# Create logs directory once at import
+LOG_DIR = 'logs'
+os.makedirs(LOG_DIR, exist_ok=True)
+
+# Formatters shared by every handler
+DETAILED_FORMATTER = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+SIMPLE_FORMATTER = logging.Formatter(
+    '%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+PASSTHROUGH_FORMATTER = logging.Formatter('%(message)s')  # JSON log lines
+
+# Header names (lowercase) whose values are masked in API logs
+SENSITIVE_HEADERS = frozenset({'x-api-key', 'authorization', 'api-key', 'api_key'})
+
+# None of our formats use process/thread info - skip collecting it per record
+logging.logProcesses = False
+logging.logThreads = False
+logging.logMultiprocessing = False
+
+# Background threads that write queued records to the log files
+_queue_listeners = []
+_listener_pid = os.getpid()
+
+
+def _queued(*handlers):
+    """
+    Put file handlers behind a queue so logging calls only enqueue the
+    record; a QueueListener thread does the disk writes and rotation
+    """
+    queue_handler = QueueHandler(queue.Queue(-1))
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _queue_listeners.append((queue_handler, listener))
+    return queue_handler
+
+
+def restart_queue_listeners():
+    """
+    Start fresh queues and listener threads after a fork (e.g. gunicorn
+    preload_app): threads started in the parent do not exist in the child,
+    and the inherited queue may hold a lock taken by one of them
+    """
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    _listener_pid = os.getpid()
+    
+    for i, (queue_handler, listener) in enumerate(_queue_listeners):
+        queue_handler.queue = queue.Queue(-1)
+        fresh = QueueListener(queue_handler.queue, *listener.handlers, respect_handler_level=True)
+        fresh.start()
+        _queue_listeners[i] = (queue_handler, fresh)
+
+
+@atexit.register
+def _stop_queue_listeners():
+    """Flush remaining records on shutdown"""
+    for _, listener in _queue_listeners:
+        listener.stop()
 
 def setup_logging():
     """
@@ -13,10 +79,7 @@ def setup_logging():
     - Errors
     - User queries
     """
-    
-    # Create logs directory if it doesn't exist
-    log_dir = 'logs'
-    os.makedirs(log_dir, exist_ok=True)
+    log_dir = LOG_DIR
     
     # Root logger configuration
     root_logger = logging.getLogger()
@@ -25,21 +88,10 @@ def setup_logging():
     # Clear existing handlers
     root_logger.handlers = []
     
-    # Format for logs
-    detailed_formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
-    simple_formatter = logging.Formatter(
-        '%(asctime)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
     # Console Handler (for development)
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(simple_formatter)
+    console_handler.setFormatter(SIMPLE_FORMATTER)
     root_logger.addHandler(console_handler)
     
     # File Handler - General App Logs (Rotating by size)
@@ -49,8 +101,7 @@ def setup_logging():
         backupCount=5
     )
     app_file_handler.setLevel(logging.INFO)
-    app_file_handler.setFormatter(detailed_formatter)
-    root_logger.addHandler(app_file_handler)
+    app_file_handler.setFormatter(DETAILED_FORMATTER)
     
     # File Handler - Error Logs
     error_file_handler = RotatingFileHandler(
@@ -59,8 +110,7 @@ def setup_logging():
         backupCount=5
     )
     error_file_handler.setLevel(logging.ERROR)
-    error_file_handler.setFormatter(detailed_formatter)
-    root_logger.addHandler(error_file_handler)
+    error_file_handler.setFormatter(DETAILED_FORMATTER)
     
     # File Handler - Debug Logs (Daily rotation)
     debug_file_handler = TimedRotatingFileHandler(
@@ -70,8 +120,10 @@ def setup_logging():
         backupCount=7
     )
     debug_file_handler.setLevel(logging.DEBUG)
-    debug_file_handler.setFormatter(detailed_formatter)
-    root_logger.addHandler(debug_file_handler)
+    debug_file_handler.setFormatter(DETAILED_FORMATTER)
+    
+    # File writes happen on a background thread
+    root_logger.addHandler(_queued(app_file_handler, error_file_handler, debug_file_handler))
     
     return root_logger
 
@@ -86,25 +138,24 @@ class APILogger:
         self.logger = logging.getLogger('APILogger')
         self.logger.setLevel(logging.INFO)
         
-        # Create separate file for API logs
-        log_dir = 'logs'
-        os.makedirs(log_dir, exist_ok=True)
-        
         # JSON format handler for API logs
         api_handler = RotatingFileHandler(
-            os.path.join(log_dir, 'api_calls.log'),
+            os.path.join(LOG_DIR, 'api_calls.log'),
             maxBytes=50*1024*1024,  # 50MB
             backupCount=10
         )
         api_handler.setLevel(logging.INFO)
         
-        # Simple formatter for JSON logs
-        formatter = logging.Formatter('%(message)s')
-        api_handler.setFormatter(formatter)
+        api_handler.setFormatter(PASSTHROUGH_FORMATTER)
         
-        self.logger.addHandler(api_handler)
+        self.logger.addHandler(_queued(api_handler))
         self.logger.propagate = False  # Don't propagate to root logger
     
+    @property
+    def enabled(self):
+        """Whether log_api_call would write anything; lets callers skip building params"""
+        return self.logger.isEnabledFor(logging.INFO)
+    
     def log_api_call(self, service_name, endpoint, method='GET', params=None, 
                      headers=None, response_status=None, response_data=None, 
                      response_time=None, error=None):
@@ -122,6 +173,10 @@ class APILogger:
             response_time: Time taken for the request in seconds
             error: Error message if request failed
         """
+        # Skip building the entry when nothing would be written
+        if not self.enabled:
+            return
+        
         log_entry = {
             'timestamp': datetime.now().isoformat(),
             'service': service_name,
@@ -139,22 +194,17 @@ class APILogger:
         if response_data:
             log_entry['response_summary'] = self._summarize_response(response_data)
         
-        self.logger.info(json.dumps(log_entry))
+        self.logger.info(orjson.dumps(log_entry).decode())
     
     def _mask_sensitive_data(self, headers):
         """Mask API keys and sensitive information"""
         if not headers:
             return None
         
-        masked = dict(headers)
-        sensitive_keys = ['x-api-key', 'authorization', 'api-key', 'api_key']
-        
-        for key in masked:
-            if key.lower() in sensitive_keys:
-                if masked[key]:
-                    masked[key] = masked[key][:8] + '...' + masked[key][-4:]
-        
-        return masked
+        return {
+            key: (value[:8] + '...' + value[-4:] if value and key.lower() in SENSITIVE_HEADERS else value)
+            for key, value in headers.items()
+        }
     
     def _summarize_response(self, response_data):
         """Create summary of response data"""
@@ -187,27 +237,26 @@ class UserQueryLogger:
         self.logger = logging.getLogger('UserQueryLogger')
         self.logger.setLevel(logging.INFO)
         
-        log_dir = 'logs'
-        os.makedirs(log_dir, exist_ok=True)
-        
         query_handler = TimedRotatingFileHandler(
-            os.path.join(log_dir, 'user_queries.log'),
+            os.path.join(LOG_DIR, 'user_queries.log'),
             when='midnight',
             interval=1,
             backupCount=30  # Keep 30 days
         )
         query_handler.setLevel(logging.INFO)
         
-        formatter = logging.Formatter('%(message)s')
-        query_handler.setFormatter(formatter)
+        query_handler.setFormatter(PASSTHROUGH_FORMATTER)
         
-        self.logger.addHandler(query_handler)
+        self.logger.addHandler(_queued(query_handler))
         self.logger.propagate = False
     
     def log_query(self, user_query, query_type, detected_station=None, 
                   detected_train_line=None, response_time=None, 
                   response_length=None, error=None):
         """Log user query with metadata"""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        
         log_entry = {
             'timestamp': datetime.now().isoformat(),
             'query': user_query,
@@ -220,7 +269,7 @@ class UserQueryLogger:
             'error': error
         }
         
-        self.logger.info(json.dumps(log_entry))
+        self.logger.info(orjson.dumps(log_entry).decode())
 
 
 # Initialize loggers
@@ -0,0 +1,23 @@
+import os
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_redis_client():
+    """
+    Shared Redis client built from REDIS_URL
+    Returns None when REDIS_URL is not set (local development)
+    """
+    redis_url = os.getenv('REDIS_URL')
+    if not redis_url:
+        return None
+
+    import redis
+
+    # One connection pool per process, shared by every caller
+    pool = redis.ConnectionPool.from_url(redis_url)
+    logger.info("Redis client initialized")
+    return redis.Redis(connection_pool=pool)
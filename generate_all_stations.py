@@ -1,7 +1,6 @@
-import json
-import csv
+import os
 import requests
-from io import StringIO
+from utils.station_loader import DATASET_URL, OUTPUT_FILE, fetch_raw, parse, save_stations
 
 def download_and_convert_stations():
     """
@@ -14,78 +13,11 @@ def download_and_convert_stations():
     print("🚇 NYC Subway Station Data Converter")
     print("=" * 60)
     
-    # Try NY Open Data API first (more reliable)
-    ny_open_data_url = "https://data.ny.gov/api/views/39hk-dx4f/rows.csv?accessType=DOWNLOAD"
-    
     try:
         print("\n📥 Downloading from NY Open Data Portal...")
-        response = requests.get(ny_open_data_url, timeout=30)
-        response.raise_for_status()
-        print(f"✓ Downloaded {len(response.content)} bytes")
-        
-        # Parse CSV
-        csv_data = StringIO(response.text)
-        reader = csv.DictReader(csv_data)
-        
-        # Show available columns
-        print(f"\n📋 Available columns: {', '.join(reader.fieldnames)}")
-        
-        # Convert to our format
-        stations_dict = {}  # Use dict to avoid duplicates
-        route_mapping = {}
-        
-        for row in reader:
-            # Extract key fields
-            stop_id = row.get('GTFS Stop ID', '').strip()
-            stop_name = row.get('Stop Name', '').strip()
-            borough = row.get('Borough', '').strip()
-            
-            # Get coordinates
-            try:
-                lat = float(row.get('GTFS Latitude', 0))
-                lon = float(row.get('GTFS Longitude', 0))
-            except (ValueError, TypeError):
-                lat, lon = 0.0, 0.0
-            
-            # Parse routes (can be like "A-C-E" or "1-2-3")
-            daytime_routes = row.get('Daytime Routes', '').strip()
-            routes = [r.strip() for r in daytime_routes.replace('-', ' ').split() if r.strip()]
-            
-            if not stop_id or not stop_name:
-                continue
-            
-            # Create unique key (complex ID)
-            complex_id = row.get('Complex ID', stop_id)
-            
-            # Group by complex to consolidate stations
-            if complex_id not in stations_dict:
-                # Generate GTFS stop IDs (with N/S suffixes for direction)
-                base_stop_id = stop_id
-                gtfs_stop_ids = [base_stop_id]
-                
-                # Add directional variants
-                if not base_stop_id.endswith('N') and not base_stop_id.endswith('S'):
-                    gtfs_stop_ids.extend([f"{base_stop_id}N", f"{base_stop_id}S"])
-                
-                stations_dict[complex_id] = {
-                    "stop_id": base_stop_id,
-                    "stop_name": stop_name,
-                    "stop_lat": lat,
-                    "stop_lon": lon,
-                    "routes": routes,
-                    "borough": borough,
-                    "gtfs_stop_ids": gtfs_stop_ids
-                }
-            else:
-                # Merge routes if station already exists
-                existing = stations_dict[complex_id]
-                existing['routes'] = list(set(existing['routes'] + routes))
+        print(f"✓ Loaded {len(fetch_raw())} bytes")
         
-        # Convert to list
-        stations_list = list(stations_dict.values())
-        
-        # Sort by stop name
-        stations_list.sort(key=lambda x: x['stop_name'])
+        stations_list = parse()
         
         print(f"\n✓ Processed {len(stations_list)} unique stations")
         
@@ -96,16 +28,14 @@ def download_and_convert_stations():
                 "total_stations": len(stations_list),
                 "last_updated": "2025-11-05",
                 "source": "NY Open Data Portal - MTA Subway Stations",
-                "source_url": ny_open_data_url
+                "source_url": DATASET_URL
             }
         }
         
         # Save to file
-        output_file = "data/subway_stations.json"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
+        save_stations(output_data)
         
-        print(f"✓ Saved to {output_file}")
+        print(f"✓ Saved to {OUTPUT_FILE}")
         
         # Print statistics
         print("\n📊 Statistics:")
@@ -122,9 +52,7 @@ def download_and_convert_stations():
             print(f"   - {borough}: {count}")
         
         # Count routes
-        all_routes = set()
-        for station in stations_list:
-            all_routes.update(station['routes'])
+        all_routes = set().union(*(station['routes'] for station in stations_list))
         
         print(f"\n   Total routes: {len(all_routes)}")
         print(f"   Routes: {', '.join(sorted(all_routes))}")
@@ -148,65 +76,70 @@ def download_and_convert_stations():
         traceback.print_exc()
         return False
 
+# Static fallback dataset, one tuple per station in STATION_FIELDS order
+STATION_FIELDS = ("stop_id", "stop_name", "stop_lat", "stop_lon", "routes", "borough", "gtfs_stop_ids")
+
+SAMPLE_STATION_ROWS = (
+    # Manhattan - 1/2/3 Line
+    ("101", "Van Cortlandt Park-242 St", 40.889248, -73.898583, ("1",), "Bronx", ("101", "101N", "101S")),
+    ("120", "96 St", 40.793919, -73.972323, ("1", "2", "3"), "Manhattan", ("120", "120N", "120S")),
+    ("123", "72 St", 40.778453, -73.981963, ("1", "2", "3"), "Manhattan", ("123", "123N", "123S")),
+    ("125", "59 St-Columbus Circle", 40.768247, -73.981929, ("A", "B", "C", "D", "1"), "Manhattan", ("125", "125N", "125S", "A27", "A27N", "A27S", "D14", "D14N", "D14S")),
+    ("127", "Times Sq-42 St", 40.755983, -73.986229, ("1", "2", "3", "7", "N", "Q", "R", "W", "S"), "Manhattan", ("127", "127N", "127S", "902", "902N", "902S", "R16", "R16N", "R16S", "725", "725N", "725S")),
+    ("128", "34 St-Penn Station", 40.750373, -73.991057, ("1", "2", "3", "A", "C", "E"), "Manhattan", ("128", "128N", "128S", "A28", "A28N", "A28S")),
+    ("132", "14 St", 40.737826, -74.000201, ("1", "2", "3"), "Manhattan", ("132", "132N", "132S")),
+
+    # Manhattan - 4/5/6 Line
+    ("621", "59 St", 40.762526, -73.967967, ("4", "5", "6"), "Manhattan", ("621", "621N", "621S")),
+    ("626", "Grand Central-42 St", 40.751776, -73.976848, ("4", "5", "6", "7", "S"), "Manhattan", ("626", "626N", "626S", "723", "723N", "723S")),
+    ("631", "33 St", 40.746081, -73.982076, ("6",), "Manhattan", ("631", "631N", "631S")),
+    ("635", "14 St-Union Sq", 40.735736, -73.990568, ("4", "5", "6", "L", "N", "Q", "R", "W"), "Manhattan", ("635", "635N", "635S", "R14", "R14N", "R14S", "L06", "L06N", "L06S")),
+    ("640", "Brooklyn Bridge-City Hall", 40.713065, -74.004131, ("4", "5", "6"), "Manhattan", ("640", "640N", "640S")),
+
+    # Manhattan - N/Q/R/W Line
+    ("R11", "Lexington Ave/59 St", 40.762526, -73.967967, ("N", "Q", "R", "W"), "Manhattan", ("R11", "R11N", "R11S")),
+    ("R14", "49 St", 40.759901, -73.984139, ("N", "Q", "R", "W"), "Manhattan", ("R14", "R14N", "R14S")),
+    ("R16", "Times Sq-42 St", 40.755983, -73.986229, ("N", "Q", "R", "W"), "Manhattan", ("R16", "R16N", "R16S")),
+    ("R17", "34 St-Herald Sq", 40.749567, -73.987621, ("B", "D", "F", "M", "N", "Q", "R", "W"), "Manhattan", ("R17", "R17N", "R17S", "D16", "D16N", "D16S")),
+
+    # Manhattan - A/C/E Line
+    ("A02", "Inwood-207 St", 40.868072, -73.919899, ("A",), "Manhattan", ("A02", "A02N", "A02S")),
+    ("A27", "59 St-Columbus Circle", 40.768247, -73.981929, ("A", "B", "C", "D"), "Manhattan", ("A27", "A27N", "A27S")),
+    ("A28", "50 St", 40.762456, -73.985984, ("C", "E"), "Manhattan", ("A28", "A28N", "A28S")),
+    ("A32", "34 St-Penn Station", 40.752287, -73.993391, ("A", "C", "E"), "Manhattan", ("A32", "A32N", "A32S")),
+
+    # Manhattan - B/D/F/M Line
+    ("D14", "59 St-Columbus Circle", 40.768247, -73.981929, ("B", "D"), "Manhattan", ("D14", "D14N", "D14S")),
+    ("D15", "47-50 Sts-Rockefeller Ctr", 40.758663, -73.981329, ("B", "D", "F", "M"), "Manhattan", ("D15", "D15N", "D15S")),
+    ("D16", "34 St-Herald Sq", 40.749567, -73.987621, ("B", "D", "F", "M"), "Manhattan", ("D16", "D16N", "D16S")),
+
+    # Manhattan - L Line
+    ("L06", "14 St-Union Sq", 40.735736, -73.990568, ("L",), "Manhattan", ("L06", "L06N", "L06S")),
+    ("L08", "8 Ave", 40.739777, -74.002578, ("L",), "Manhattan", ("L08", "L08N", "L08S")),
+
+    # Manhattan - 7 Line
+    ("725", "Times Sq-42 St", 40.755983, -73.986229, ("7",), "Manhattan", ("725", "725N", "725S")),
+    ("723", "Grand Central-42 St", 40.751776, -73.976848, ("7",), "Manhattan", ("723", "723N", "723S")),
+
+    # Brooklyn
+    ("R31", "95 St", 40.616622, -74.030876, ("R",), "Brooklyn", ("R31", "R31N", "R31S")),
+    ("D19", "Atlantic Ave-Barclays Ctr", 40.684359, -73.977666, ("B", "D", "N", "Q", "R", "2", "3", "4", "5"), "Brooklyn", ("D19", "D19N", "D19S", "R30", "R30N", "R30S", "238", "238N", "238S")),
+    ("R26", "Jay St-MetroTech", 40.692338, -73.987342, ("A", "C", "F", "R"), "Brooklyn", ("R26", "R26N", "R26S", "A41", "A41N", "A41S", "F20", "F20N", "F20S")),
+
+    # Queens
+    ("Q01", "96 St", 40.784318, -73.947152, ("Q",), "Manhattan", ("Q01", "Q01N", "Q01S")),
+    ("702", "Flushing-Main St", 40.759465, -73.830109, ("7",), "Queens", ("702", "702N", "702S")),
+
+    # Bronx
+    ("D03", "161 St-Yankee Stadium", 40.827994, -73.925831, ("4", "B", "D"), "Bronx", ("D03", "D03N", "D03S", "401", "401N", "401S")),
+)
+
 def create_sample_data():
     """Create a comprehensive sample dataset as fallback"""
     print("\n📝 Creating comprehensive sample dataset...")
     
     sample_stations = {
-        "stations": [
-            # Manhattan - 1/2/3 Line
-            {"stop_id": "101", "stop_name": "Van Cortlandt Park-242 St", "stop_lat": 40.889248, "stop_lon": -73.898583, "routes": ["1"], "borough": "Bronx", "gtfs_stop_ids": ["101", "101N", "101S"]},
-            {"stop_id": "120", "stop_name": "96 St", "stop_lat": 40.793919, "stop_lon": -73.972323, "routes": ["1", "2", "3"], "borough": "Manhattan", "gtfs_stop_ids": ["120", "120N", "120S"]},
-            {"stop_id": "123", "stop_name": "72 St", "stop_lat": 40.778453, "stop_lon": -73.981963, "routes": ["1", "2", "3"], "borough": "Manhattan", "gtfs_stop_ids": ["123", "123N", "123S"]},
-            {"stop_id": "125", "stop_name": "59 St-Columbus Circle", "stop_lat": 40.768247, "stop_lon": -73.981929, "routes": ["A", "B", "C", "D", "1"], "borough": "Manhattan", "gtfs_stop_ids": ["125", "125N", "125S", "A27", "A27N", "A27S", "D14", "D14N", "D14S"]},
-            {"stop_id": "127", "stop_name": "Times Sq-42 St", "stop_lat": 40.755983, "stop_lon": -73.986229, "routes": ["1", "2", "3", "7", "N", "Q", "R", "W", "S"], "borough": "Manhattan", "gtfs_stop_ids": ["127", "127N", "127S", "902", "902N", "902S", "R16", "R16N", "R16S", "725", "725N", "725S"]},
-            {"stop_id": "128", "stop_name": "34 St-Penn Station", "stop_lat": 40.750373, "stop_lon": -73.991057, "routes": ["1", "2", "3", "A", "C", "E"], "borough": "Manhattan", "gtfs_stop_ids": ["128", "128N", "128S", "A28", "A28N", "A28S"]},
-            {"stop_id": "132", "stop_name": "14 St", "stop_lat": 40.737826, "stop_lon": -74.000201, "routes": ["1", "2", "3"], "borough": "Manhattan", "gtfs_stop_ids": ["132", "132N", "132S"]},
-            
-            # Manhattan - 4/5/6 Line  
-            {"stop_id": "621", "stop_name": "59 St", "stop_lat": 40.762526, "stop_lon": -73.967967, "routes": ["4", "5", "6"], "borough": "Manhattan", "gtfs_stop_ids": ["621", "621N", "621S"]},
-            {"stop_id": "626", "stop_name": "Grand Central-42 St", "stop_lat": 40.751776, "stop_lon": -73.976848, "routes": ["4", "5", "6", "7", "S"], "borough": "Manhattan", "gtfs_stop_ids": ["626", "626N", "626S", "723", "723N", "723S"]},
-            {"stop_id": "631", "stop_name": "33 St", "stop_lat": 40.746081, "stop_lon": -73.982076, "routes": ["6"], "borough": "Manhattan", "gtfs_stop_ids": ["631", "631N", "631S"]},
-            {"stop_id": "635", "stop_name": "14 St-Union Sq", "stop_lat": 40.735736, "stop_lon": -73.990568, "routes": ["4", "5", "6", "L", "N", "Q", "R", "W"], "borough": "Manhattan", "gtfs_stop_ids": ["635", "635N", "635S", "R14", "R14N", "R14S", "L06", "L06N", "L06S"]},
-            {"stop_id": "640", "stop_name": "Brooklyn Bridge-City Hall", "stop_lat": 40.713065, "stop_lon": -74.004131, "routes": ["4", "5", "6"], "borough": "Manhattan", "gtfs_stop_ids": ["640", "640N", "640S"]},
-            
-            # Manhattan - N/Q/R/W Line
-            {"stop_id": "R11", "stop_name": "Lexington Ave/59 St", "stop_lat": 40.762526, "stop_lon": -73.967967, "routes": ["N", "Q", "R", "W"], "borough": "Manhattan", "gtfs_stop_ids": ["R11", "R11N", "R11S"]},
-            {"stop_id": "R14", "stop_name": "49 St", "stop_lat": 40.759901, "stop_lon": -73.984139, "routes": ["N", "Q", "R", "W"], "borough": "Manhattan", "gtfs_stop_ids": ["R14", "R14N", "R14S"]},
-            {"stop_id": "R16", "stop_name": "Times Sq-42 St", "stop_lat": 40.755983, "stop_lon": -73.986229, "routes": ["N", "Q", "R", "W"], "borough": "Manhattan", "gtfs_stop_ids": ["R16", "R16N", "R16S"]},
-            {"stop_id": "R17", "stop_name": "34 St-Herald Sq", "stop_lat": 40.749567, "stop_lon": -73.987621, "routes": ["B", "D", "F", "M", "N", "Q", "R", "W"], "borough": "Manhattan", "gtfs_stop_ids": ["R17", "R17N", "R17S", "D16", "D16N", "D16S"]},
-            
-            # Manhattan - A/C/E Line
-            {"stop_id": "A02", "stop_name": "Inwood-207 St", "stop_lat": 40.868072, "stop_lon": -73.919899, "routes": ["A"], "borough": "Manhattan", "gtfs_stop_ids": ["A02", "A02N", "A02S"]},
-            {"stop_id": "A27", "stop_name": "59 St-Columbus Circle", "stop_lat": 40.768247, "stop_lon": -73.981929, "routes": ["A", "B", "C", "D"], "borough": "Manhattan", "gtfs_stop_ids": ["A27", "A27N", "A27S"]},
-            {"stop_id": "A28", "stop_name": "50 St", "stop_lat": 40.762456, "stop_lon": -73.985984, "routes": ["C", "E"], "borough": "Manhattan", "gtfs_stop_ids": ["A28", "A28N", "A28S"]},
-            {"stop_id": "A32", "stop_name": "34 St-Penn Station", "stop_lat": 40.752287, "stop_lon": -73.993391, "routes": ["A", "C", "E"], "borough": "Manhattan", "gtfs_stop_ids": ["A32", "A32N", "A32S"]},
-            
-            # Manhattan - B/D/F/M Line
-            {"stop_id": "D14", "stop_name": "59 St-Columbus Circle", "stop_lat": 40.768247, "stop_lon": -73.981929, "routes": ["B", "D"], "borough": "Manhattan", "gtfs_stop_ids": ["D14", "D14N", "D14S"]},
-            {"stop_id": "D15", "stop_name": "47-50 Sts-Rockefeller Ctr", "stop_lat": 40.758663, "stop_lon": -73.981329, "routes": ["B", "D", "F", "M"], "borough": "Manhattan", "gtfs_stop_ids": ["D15", "D15N", "D15S"]},
-            {"stop_id": "D16", "stop_name": "34 St-Herald Sq", "stop_lat": 40.749567, "stop_lon": -73.987621, "routes": ["B", "D", "F", "M"], "borough": "Manhattan", "gtfs_stop_ids": ["D16", "D16N", "D16S"]},
-            
-            # Manhattan - L Line
-            {"stop_id": "L06", "stop_name": "14 St-Union Sq", "stop_lat": 40.735736, "stop_lon": -73.990568, "routes": ["L"], "borough": "Manhattan", "gtfs_stop_ids": ["L06", "L06N", "L06S"]},
-            {"stop_id": "L08", "stop_name": "8 Ave", "stop_lat": 40.739777, "stop_lon": -74.002578, "routes": ["L"], "borough": "Manhattan", "gtfs_stop_ids": ["L08", "L08N", "L08S"]},
-            
-            # Manhattan - 7 Line
-            {"stop_id": "725", "stop_name": "Times Sq-42 St", "stop_lat": 40.755983, "stop_lon": -73.986229, "routes": ["7"], "borough": "Manhattan", "gtfs_stop_ids": ["725", "725N", "725S"]},
-            {"stop_id": "723", "stop_name": "Grand Central-42 St", "stop_lat": 40.751776, "stop_lon": -73.976848, "routes": ["7"], "borough": "Manhattan", "gtfs_stop_ids": ["723", "723N", "723S"]},
-            
-            # Brooklyn
-            {"stop_id": "R31", "stop_name": "95 St", "stop_lat": 40.616622, "stop_lon": -74.030876, "routes": ["R"], "borough": "Brooklyn", "gtfs_stop_ids": ["R31", "R31N", "R31S"]},
-            {"stop_id": "D19", "stop_name": "Atlantic Ave-Barclays Ctr", "stop_lat": 40.684359, "stop_lon": -73.977666, "routes": ["B", "D", "N", "Q", "R", "2", "3", "4", "5"], "borough": "Brooklyn", "gtfs_stop_ids": ["D19", "D19N", "D19S", "R30", "R30N", "R30S", "238", "238N", "238S"]},
-            {"stop_id": "R26", "stop_name": "Jay St-MetroTech", "stop_lat": 40.692338, "stop_lon": -73.987342, "routes": ["A", "C", "F", "R"], "borough": "Brooklyn", "gtfs_stop_ids": ["R26", "R26N", "R26S", "A41", "A41N", "A41S", "F20", "F20N", "F20S"]},
-            
-            # Queens
-            {"stop_id": "Q01", "stop_name": "96 St", "stop_lat": 40.784318, "stop_lon": -73.947152, "routes": ["Q"], "borough": "Manhattan", "gtfs_stop_ids": ["Q01", "Q01N", "Q01S"]},
-            {"stop_id": "702", "stop_name": "Flushing-Main St", "stop_lat": 40.759465, "stop_lon": -73.830109, "routes": ["7"], "borough": "Queens", "gtfs_stop_ids": ["702", "702N", "702S"]},
-            
-            # Bronx
-            {"stop_id": "D03", "stop_name": "161 St-Yankee Stadium", "stop_lat": 40.827994, "stop_lon": -73.925831, "routes": ["4", "B", "D"], "borough": "Bronx", "gtfs_stop_ids": ["D03", "D03N", "D03S", "401", "401N", "401S"]},
-        ],
+        "stations": [dict(zip(STATION_FIELDS, row)) for row in SAMPLE_STATION_ROWS],
         "metadata": {
             "total_stations": 38,
             "last_updated": "2025-11-05",
@@ -216,17 +149,13 @@ def create_sample_data():
     }
     
     # Save to file
-    output_file = "data/subway_stations.json"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(sample_stations, f, indent=2, ensure_ascii=False)
+    save_stations(sample_stations)
     
     print(f"✓ Created sample dataset with {len(sample_stations['stations'])} stations")
-    print(f"✓ Saved to {output_file}")
+    print(f"✓ Saved to {OUTPUT_FILE}")
     return True
 
 if __name__ == "__main__":
-    import os
-    
     # Create data directory if it doesn't exist
     os.makedirs('data', exist_ok=True)
     
@@ -1,5 +1,4 @@
-import json
-import requests
+from utils.station_loader import save_stations
 
 def generate_complete_stations():
     """Generate complete NYC subway stations JSON file"""
@@ -66,8 +65,7 @@ def generate_complete_stations():
     }
     
     # Save to file
-    with open('data/subway_stations.json', 'w') as f:
-        json.dump(stations, f, indent=2)
+    save_stations(stations)
     
     print(f"Generated subway_stations.json with {len(stations['stations'])} stations")
 
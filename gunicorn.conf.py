@@ -0,0 +1,30 @@
+"""
+Gunicorn configuration for production
+Usage: gunicorn -c gunicorn.conf.py app:app
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '7860')}"
+
+# Threaded workers - chat requests spend most of their time waiting on
+# Gemini / MTA HTTP calls, so threads let those waits overlap
+worker_class = "gthread"
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+# Note: chat history is kept in process memory, so with several workers a
+# session may land on a worker without its history. Set WEB_CONCURRENCY=1
+# if conversational memory matters more than throughput.
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# Load the app (services, station tables) once in the master and fork,
+# so workers share that memory copy-on-write
+preload_app = True
+
+# Gemini agent runs can take up to ~30s
+timeout = 60
+
+
+def post_fork(server, worker):
+    """Restart the log writer threads in each forked worker"""
+    from config.logging_config import restart_queue_listeners
+    restart_queue_listeners()
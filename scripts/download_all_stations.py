@@ -1,9 +1,14 @@
-import json
+import os
+import sys
 import requests
-import csv
-from io import StringIO
 from collections import defaultdict
 
+# Run from anywhere: make the repo root importable for utils.station_loader
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.station_loader import OUTPUT_FILE, fetch_raw, parse, save_stations
+
+
 def download_complete_stations():
     """
     Download all NYC subway stations from official NYC Open Data
@@ -12,73 +17,10 @@ def download_complete_stations():
     
     print("📥 Downloading complete NYC subway station data...")
     
-    # NYC Open Data API endpoint for subway stations
-    url = "https://data.ny.gov/resource/39hk-dx4f.json"
-    
-    # Add limit parameter to get all records
-    params = {
-        '$limit': 10000,  # Get all stations
-        '$order': 'stop_name'
-    }
-    
     try:
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        data = response.json()
+        print(f"✓ Downloaded {len(fetch_raw())} bytes")
         
-        print(f"✓ Downloaded {len(data)} station records")
-        
-        # Process and deduplicate stations
-        stations_dict = {}
-        
-        for record in data:
-            stop_id = record.get('gtfs_stop_id', '').strip()
-            stop_name = record.get('stop_name', '').strip()
-            
-            if not stop_id or not stop_name:
-                continue
-            
-            # Get coordinates
-            try:
-                lat = float(record.get('gtfs_latitude', 0))
-                lon = float(record.get('gtfs_longitude', 0))
-            except (ValueError, TypeError):
-                lat, lon = 0.0, 0.0
-            
-            # Parse routes (space-separated in the data)
-            daytime_routes = record.get('daytime_routes', '').strip()
-            routes = [r.strip() for r in daytime_routes.split() if r.strip()]
-            
-            # Get borough
-            borough = record.get('borough', '').strip()
-            
-            # Use complex_id to group related platforms
-            complex_id = record.get('complex_id', stop_id)
-            
-            if complex_id not in stations_dict:
-                # Generate GTFS stop IDs with directional suffixes
-                base_id = stop_id.rstrip('NS')  # Remove existing N/S
-                gtfs_ids = [base_id]
-                if not base_id.endswith('N') and not base_id.endswith('S'):
-                    gtfs_ids.extend([f"{base_id}N", f"{base_id}S"])
-                
-                stations_dict[complex_id] = {
-                    'stop_id': base_id,
-                    'stop_name': stop_name,
-                    'stop_lat': lat,
-                    'stop_lon': lon,
-                    'routes': routes,
-                    'borough': borough,
-                    'gtfs_stop_ids': gtfs_ids
-                }
-            else:
-                # Merge routes for same complex
-                existing = stations_dict[complex_id]
-                existing['routes'] = list(set(existing['routes'] + routes))
-        
-        # Convert to list and sort
-        stations_list = list(stations_dict.values())
-        stations_list.sort(key=lambda x: x['stop_name'])
+        stations_list = parse()
         
         print(f"✓ Processed {len(stations_list)} unique stations")
         
@@ -94,14 +36,9 @@ def download_complete_stations():
         }
         
         # Save to file
-        import os
-        os.makedirs('data', exist_ok=True)
+        save_stations(output_data)
         
-        output_file = 'data/subway_stations.json'
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
-        
-        print(f"✓ Saved to {output_file}")
+        print(f"✓ Saved to {OUTPUT_FILE}")
         
         # Print statistics
         print("\n📊 Statistics:")
@@ -117,9 +54,7 @@ def download_complete_stations():
             print(f"   - {borough}: {count}")
         
         # Count routes
-        all_routes = set()
-        for station in stations_list:
-            all_routes.update(station['routes'])
+        all_routes = set().union(*(station['routes'] for station in stations_list))
         
         print(f"\n   Total routes: {len(all_routes)}")
         print(f"   Routes: {', '.join(sorted(all_routes))}")
@@ -131,7 +66,8 @@ def download_complete_stations():
             print(f"   - {station['stop_name']} ({routes_str})")
         
         # Check for Jay St-MetroTech specifically
-        jay_st = next((s for s in stations_list if 'jay st' in s['stop_name'].lower()), None)
+        name_index = {s['stop_name'].casefold(): s for s in stations_list}
+        jay_st = name_index.get('jay st-metrotech')
         if jay_st:
             print(f"\n✓ Found Jay St-MetroTech: {jay_st['stop_name']}")
             print(f"  Routes: {', '.join(jay_st['routes'])}")
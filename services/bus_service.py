@@ -1,6 +1,18 @@
-import requests
+import heapq
+import logging
+import time
 from datetime import datetime
+from operator import itemgetter
+from google.protobuf.internal import api_implementation
 from google.transit import gtfs_realtime_pb2
+from config.http_config import get_http_session
+
+logger = logging.getLogger(__name__)
+
+# protobuf>=4 decodes through the upb C extension; the pure-Python fallback
+# is orders of magnitude slower on multi-MB GTFS-RT feeds
+if api_implementation.Type() == 'python':
+    logger.warning("protobuf is using the pure-Python backend; GTFS-RT parsing will be slow")
 
 class BusService:
     """Service for MTA Bus real-time data"""
@@ -8,9 +20,54 @@ class BusService:
     # Note: Bus APIs require an API key
     BASE_URL = 'https://gtfsrt.prod.obanyc.com'
     
+    # Feeds refresh about every 30s; serve the parsed copy for this long
+    # before revalidating with the server
+    FEED_TTL = 20
+    
     def __init__(self, api_key=None):
         self.api_key = api_key
-        self.session = requests.Session()
+        self.session = get_http_session()
+        # endpoint -> (etag, last_modified, parsed feed, fetched_at)
+        self.feed_cache = {}
+    
+    def _fetch_feed(self, endpoint):
+        """
+        Download and parse one GTFS-RT feed
+        Reuses the parsed feed within FEED_TTL, then revalidates with
+        If-None-Match / If-Modified-Since so an unchanged feed is not re-parsed
+        """
+        cached = self.feed_cache.get(endpoint)
+        if cached and time.monotonic() - cached[3] < self.FEED_TTL:
+            return cached[2]
+        
+        url = f'{self.BASE_URL}/{endpoint}'
+        params = {'key': self.api_key}
+        headers = {}
+        if cached:
+            etag, last_modified = cached[0], cached[1]
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        
+        # Read the body straight off the socket in one piece instead of letting
+        # requests assemble response.content from 10KB chunks
+        with self.session.get(url, params=params, headers=headers, timeout=10, stream=True) as response:
+            if response.status_code == 304 and cached:
+                self.feed_cache[endpoint] = (*cached[:3], time.monotonic())
+                return cached[2]
+            
+            response.raise_for_status()
+            response.raw.decode_content = True  # Undo any gzip transfer encoding
+            feed = gtfs_realtime_pb2.FeedMessage.FromString(response.raw.read())
+        
+        self.feed_cache[endpoint] = (
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified'),
+            feed,
+            time.monotonic()
+        )
+        return feed
     
     def get_trip_updates(self, route=None):
         """Get bus trip updates"""
@@ -18,16 +75,12 @@ class BusService:
             return {'error': 'Bus API key required. Get one from bustime.mta.info/wiki/Developers'}
         
         try:
-            url = f'{self.BASE_URL}/tripUpdates'
-            params = {'key': self.api_key}
+            feed = self._fetch_feed('tripUpdates')
             
-            response = self.session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            feed = gtfs_realtime_pb2.FeedMessage()
-            feed.ParseFromString(response.content)
-            
-            updates = []
+            # Collect plain (minutes, route, stop, time) tuples and only build
+            # dicts for the ten soonest arrivals
+            now = int(time.time())
+            arrivals = []
             for entity in feed.entity:
                 if entity.HasField('trip_update'):
                     trip = entity.trip_update.trip
@@ -37,21 +90,23 @@ class BusService:
                         if not trip.route_id.startswith(route):
                             continue
                     
+                    route_id = trip.route_id if hasattr(trip, 'route_id') else 'Unknown'
                     for stop_time_update in entity.trip_update.stop_time_update:
                         if stop_time_update.HasField('arrival'):
                             arrival_time = stop_time_update.arrival.time
-                            arrival_datetime = datetime.fromtimestamp(arrival_time)
-                            minutes_away = int((arrival_datetime - datetime.now()).total_seconds() / 60)
-                            
-                            updates.append({
-                                'route': trip.route_id if hasattr(trip, 'route_id') else 'Unknown',
-                                'stop_id': stop_time_update.stop_id,
-                                'arrival_time': arrival_datetime.strftime('%I:%M %p'),
-                                'minutes_away': max(0, minutes_away)
-                            })
+                            minutes_away = max(0, (arrival_time - now) // 60)
+                            arrivals.append((minutes_away, route_id, stop_time_update.stop_id, arrival_time))
             
-            updates.sort(key=lambda x: x['minutes_away'])
-            return updates[:10]
+            return [
+                {
+                    'route': route_id,
+                    'stop_id': stop_id,
+                    'arrival_time': datetime.fromtimestamp(arrival_time).strftime('%I:%M %p'),
+                    'minutes_away': minutes_away
+                }
+                for minutes_away, route_id, stop_id, arrival_time
+                in heapq.nsmallest(10, arrivals, key=itemgetter(0))
+            ]
             
         except Exception as e:
             return {'error': str(e)}
@@ -62,14 +117,7 @@ class BusService:
             return {'error': 'Bus API key required'}
         
         try:
-            url = f'{self.BASE_URL}/vehiclePositions'
-            params = {'key': self.api_key}
-            
-            response = self.session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            feed = gtfs_realtime_pb2.FeedMessage()
-            feed.ParseFromString(response.content)
+            feed = self._fetch_feed('vehiclePositions')
             
             vehicles = []
             for entity in feed.entity:
@@ -99,37 +147,25 @@ class BusService:
             return {'error': 'Bus API key required'}
         
         try:
-            url = f'{self.BASE_URL}/alerts'
-            params = {'key': self.api_key}
-            
-            response = self.session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            feed = gtfs_realtime_pb2.FeedMessage()
-            feed.ParseFromString(response.content)
+            feed = self._fetch_feed('alerts')
             
             alerts = []
             for entity in feed.entity:
                 if entity.HasField('alert'):
                     alert = entity.alert
+                    affected_routes = [ie.route_id for ie in alert.informed_entity if ie.HasField('route_id')]
                     
                     # Filter by route if specified
-                    if route:
-                        route_match = False
-                        for informed_entity in alert.informed_entity:
-                            if hasattr(informed_entity, 'route_id') and informed_entity.route_id.startswith(route):
-                                route_match = True
-                                break
-                        if not route_match:
-                            continue
+                    if route and not any(r.startswith(route) for r in affected_routes):
+                        continue
                     
-                    header = alert.header_text.translation[0].text if alert.header_text.translation else "No header"
-                    description = alert.description_text.translation[0].text if alert.description_text.translation else "No description"
+                    header_translations = alert.header_text.translation
+                    description_translations = alert.description_text.translation
                     
                     alerts.append({
-                        'header': header,
-                        'description': description,
-                        'affected_routes': [ie.route_id for ie in alert.informed_entity if hasattr(ie, 'route_id')]
+                        'header': header_translations[0].text if header_translations else "No header",
+                        'description': description_translations[0].text if description_translations else "No description",
+                        'affected_routes': affected_routes
                     })
             
             return alerts
@@ -1,10 +1,14 @@
-import requests
-import json
+import orjson
 from datetime import datetime
 import time
+import re
 import logging
+from collections import Counter
+from functools import lru_cache
+from sys import intern
 from rapidfuzz import fuzz, process
 from config.logging_config import api_logger
+from config.http_config import get_http_session
 
 logger = logging.getLogger(__name__)
 
@@ -14,10 +18,54 @@ class ElevatorEscalatorService:
     EQUIPMENT_URL = 'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fnyct_ene_equipments.json'
     OUTAGE_URL = 'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fnyct_ene.json'
     
+    # Common replacements applied by _normalize_station_name
+    NAME_REPLACEMENTS = {
+        'street': 'st',
+        'avenue': 'ave',
+        'square': 'sq',
+        'saint': 'st',
+        'first': '1st',
+        'second': '2nd',
+        'third': '3rd',
+        'fourth': '4th',
+        'fifth': '5th',
+        'sixth': '6th',
+        'seventh': '7th',
+        'eighth': '8th',
+        'ninth': '9th',
+        'penn station': 'penn',
+        'grand central': 'grd cntrl',
+        'port authority': 'port auth'
+    }
+    # One pass over the name instead of a str.replace per entry
+    _NAME_REPLACEMENT_RE = re.compile('|'.join(map(re.escape, NAME_REPLACEMENTS)))
+    _PUNCTUATION_TO_SPACE = str.maketrans('-/', '  ')
+    
+    # Alternate names tried when a station lookup fails, keyed by group
+    ALTERNATE_NAMES = {
+        'times sq': ['Times Square', '42nd Street', 'Times Sq 42', '42 St Times Sq'],
+        'penn': ['34 St Penn Station', 'Pennsylvania Station', '34 St'],
+        'grand central': ['Grand Central 42 St', '42 St Grand Central', 'Grand Central Terminal'],
+        'world trade': ['World Trade Center', 'WTC Cortlandt', 'Cortlandt St'],
+        'jay st': ['Jay Street MetroTech', 'Jay St MetroTech', 'Jay Street'],
+        'atlantic': ['Atlantic Av Barclays Ctr', 'Atlantic Avenue', 'Barclays Center'],
+        'herald sq': ['34 St Herald Sq', 'Herald Square', '34 St Herald Square'],
+        'union sq': ['14 St Union Sq', 'Union Square', '14 St Union Square']
+    }
+    # Substring that triggers each group ("times sq" also covers "times square")
+    ALTERNATE_NAME_KEYS = {**{group: group for group in ALTERNATE_NAMES}, 'wtc': 'world trade'}
+    _ALTERNATE_NAME_RE = re.compile('|'.join(map(re.escape, ALTERNATE_NAME_KEYS)))
+    
     def __init__(self):
-        self.session = requests.Session()
+        self.session = get_http_session()
         self.equipment_cache = None
         self.cache_timestamp = None
+        # (normalized station name -> equipment rows, names, trigram index),
+        # rebuilt with the cache and swapped in as one tuple so concurrent
+        # lookups never see parts of two different builds
+        self._index = ({}, [], {})
+        # Equipment IDs from the latest outage feed
+        self.outage_ids = frozenset()
     
     def _normalize_station_name(self, name):
         """
@@ -29,91 +77,102 @@ class ElevatorEscalatorService:
         if not name:
             return ""
         
-        normalized = name.lower()
-        
-        # Common replacements
-        replacements = {
-            'street': 'st',
-            'avenue': 'ave',
-            'square': 'sq',
-            'saint': 'st',
-            'first': '1st',
-            'second': '2nd',
-            'third': '3rd',
-            'fourth': '4th',
-            'fifth': '5th',
-            'sixth': '6th',
-            'seventh': '7th',
-            'eighth': '8th',
-            'ninth': '9th',
-            'penn station': 'penn',
-            'grand central': 'grd cntrl',
-            'port authority': 'port auth'
-        }
-        
-        for old, new in replacements.items():
-            normalized = normalized.replace(old, new)
+        normalized = self._NAME_REPLACEMENT_RE.sub(
+            lambda m: self.NAME_REPLACEMENTS[m.group(0)], name.lower()
+        )
         
         # Remove extra punctuation and spaces
-        normalized = normalized.replace('-', ' ').replace('/', ' ')
+        normalized = normalized.translate(self._PUNCTUATION_TO_SPACE)
         normalized = ' '.join(normalized.split())
         
         return normalized
     
-    def _find_station_in_equipment(self, station_name, equipment_list):
+    def _build_equipment_index(self, equipment_data):
+        """Group equipment records by normalized station name so lookups skip re-normalizing"""
+        equipment_list = equipment_data
+        if isinstance(equipment_data, dict):
+            equipment_list = equipment_data.get('equipment', [])
+        
+        # Keep only the fields we report, already in output shape
+        index = {}
+        for eq in equipment_list:
+            if eq.get('station'):
+                # Interned so outage membership checks can short-circuit on identity
+                equipment_id = eq.get('equipmentno')
+                if equipment_id:
+                    equipment_id = intern(equipment_id)
+                index.setdefault(self._normalize_station_name(eq['station']), []).append({
+                    'equipment_id': equipment_id,
+                    'equipment_type': eq.get('equipmenttype', 'Unknown'),
+                    'serving': eq.get('serving', 'Unknown'),
+                    'ada': eq.get('ada', False),
+                    'station': eq['station'],
+                    'borough': eq.get('borough', 'Unknown')
+                })
+        
+        names = list(index)
+        
+        # Trigram -> positions in names, used to shortlist fuzzy match
+        # candidates before scoring
+        trigram_index = {}
+        for i, name in enumerate(names):
+            for trigram in self._trigrams(name):
+                trigram_index.setdefault(trigram, []).append(i)
+        
+        self._index = (index, names, trigram_index)
+    
+    @staticmethod
+    def _trigrams(text):
+        """Set of character trigrams of a normalized name"""
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+    
+    def _fuzzy_candidates(self, names, trigram_index, normalized_query, limit=30):
+        """Names sharing the most trigrams with the query (all names if none share any)"""
+        overlap = Counter()
+        for trigram in self._trigrams(normalized_query):
+            overlap.update(trigram_index.get(trigram, ()))
+        if not overlap:
+            return names
+        return [names[i] for i, _ in overlap.most_common(limit)]
+    
+    def _find_station_in_equipment(self, station_name):
         """
-        Find station in equipment list using fuzzy matching
+        Find station in the equipment index using fuzzy matching
         
         Args:
             station_name: Station name to search for
-            equipment_list: List of all equipment
         
         Returns:
             List of equipment at the matching station
         """
-        # Get all unique station names from equipment
-        station_names_in_equipment = list(set(
-            eq.get('station', '') for eq in equipment_list if eq.get('station')
-        ))
-        
         # Normalize search query
         normalized_query = self._normalize_station_name(station_name)
+        index, names, trigram_index = self._index
         
         # Try exact match first
-        matches = []
-        for eq_station in station_names_in_equipment:
-            if self._normalize_station_name(eq_station) == normalized_query:
-                matches = [eq for eq in equipment_list if eq.get('station') == eq_station]
-                logger.info(f"Exact match found: {eq_station}")
-                return matches
+        matches = index.get(normalized_query)
+        if matches:
+            logger.info(f"Exact match found: {matches[0]['station']}")
+            return matches
         
         # Try fuzzy matching
         logger.info(f"No exact match, trying fuzzy matching for: {station_name}")
         
-        # Use rapidfuzz to find best matches
-        best_matches = process.extract(
+        # Use rapidfuzz to find the best match among the trigram shortlist
+        best_match = process.extractOne(
             normalized_query,
-            [self._normalize_station_name(s) for s in station_names_in_equipment],
+            self._fuzzy_candidates(names, trigram_index, normalized_query),
             scorer=fuzz.token_sort_ratio,
-            limit=3
+            score_cutoff=70
         )
         
-        logger.info(f"Fuzzy matches: {best_matches}")
+        logger.info(f"Fuzzy match: {best_match}")
         
         # If we have a good match (>70% similarity)
-        if best_matches and best_matches[0][1] > 70:
-            # Get the original station name
-            matched_normalized = best_matches[0][0]
-            matched_station = next(
-                (s for s in station_names_in_equipment 
-                 if self._normalize_station_name(s) == matched_normalized),
-                None
-            )
-            
-            if matched_station:
-                logger.info(f"Using fuzzy match: {matched_station} (score: {best_matches[0][1]})")
-                matches = [eq for eq in equipment_list if eq.get('station') == matched_station]
-                return matches
+        if best_match and best_match[1] > 70:
+            matches = index[best_match[0]]
+            logger.info(f"Using fuzzy match: {matches[0]['station']} (score: {best_match[1]})")
+            return matches
         
         return []
     
@@ -126,32 +185,19 @@ class ElevatorEscalatorService:
         if 'error' in equipment_data:
             return equipment_data
         
-        # Get current outages
+        # Get current outages (get_outages refreshes self.outage_ids)
         outage_data = self.get_outages()
-        if 'error' in outage_data:
-            outage_data = []
-        
-        # Extract equipment list
-        equipment_list = equipment_data
-        if isinstance(equipment_data, dict):
-            equipment_list = equipment_data.get('equipment', [])
-        
-        # Extract outage IDs
-        outage_ids = set()
-        if isinstance(outage_data, list):
-            outage_ids = {item.get('equipment') for item in outage_data if item.get('equipment')}
-        elif isinstance(outage_data, dict) and 'outages' in outage_data:
-            outage_ids = {item.get('equipment') for item in outage_data.get('outages', []) if item.get('equipment')}
+        outage_ids = frozenset() if 'error' in outage_data else self.outage_ids
         
         # Find equipment at this station using fuzzy matching
-        station_equipment_raw = self._find_station_in_equipment(station_name, equipment_list)
+        station_equipment_raw = self._find_station_in_equipment(station_name)
         
         if not station_equipment_raw:
             # Try alternate names
             alternate_names = self._get_alternate_station_names(station_name)
             for alt_name in alternate_names:
                 logger.info(f"Trying alternate name: {alt_name}")
-                station_equipment_raw = self._find_station_in_equipment(alt_name, equipment_list)
+                station_equipment_raw = self._find_station_in_equipment(alt_name)
                 if station_equipment_raw:
                     break
         
@@ -164,21 +210,15 @@ class ElevatorEscalatorService:
                 'equipment': []
             }
         
-        # Process equipment
+        # Add live status to the pre-built equipment records, counting outages as we go
+        actual_station_name = station_equipment_raw[0]['station']
         station_equipment = []
-        actual_station_name = station_equipment_raw[0].get('station', station_name) if station_equipment_raw else station_name
-        
+        out_of_service = 0
         for equipment in station_equipment_raw:
-            equipment_id = equipment.get('equipmentno')
-            is_out = equipment_id in outage_ids
-            
+            is_out = equipment['equipment_id'] in outage_ids
+            out_of_service += is_out
             station_equipment.append({
-                'equipment_id': equipment_id,
-                'equipment_type': equipment.get('equipmenttype', 'Unknown'),
-                'serving': equipment.get('serving', 'Unknown'),
-                'ada': equipment.get('ada', False),
-                'station': equipment.get('station', 'Unknown'),
-                'borough': equipment.get('borough', 'Unknown'),
+                **equipment,
                 'is_out_of_service': is_out,
                 'status': 'Out of Service' if is_out else 'Operational'
             })
@@ -187,8 +227,8 @@ class ElevatorEscalatorService:
             'station': actual_station_name,
             'equipment': station_equipment,
             'total_equipment': len(station_equipment),
-            'operational': len([e for e in station_equipment if not e['is_out_of_service']]),
-            'out_of_service': len([e for e in station_equipment if e['is_out_of_service']])
+            'operational': len(station_equipment) - out_of_service,
+            'out_of_service': out_of_service
         }
     
     def _get_alternate_station_names(self, station_name):
@@ -199,33 +239,11 @@ class ElevatorEscalatorService:
         - "Times Sq-42 St" → ["Times Square", "42nd Street", "Times Square 42", "42 St"]
         - "Penn Station" → ["34 St Penn Station", "Pennsylvania Station"]
         """
-        alternates = []
         name_lower = station_name.lower()
         
-        # Common variations
-        if 'times sq' in name_lower or 'times square' in name_lower:
-            alternates.extend(['Times Square', '42nd Street', 'Times Sq 42', '42 St Times Sq'])
-        
-        if 'penn' in name_lower:
-            alternates.extend(['34 St Penn Station', 'Pennsylvania Station', '34 St'])
-        
-        if 'grand central' in name_lower:
-            alternates.extend(['Grand Central 42 St', '42 St Grand Central', 'Grand Central Terminal'])
-        
-        if 'world trade' in name_lower or 'wtc' in name_lower:
-            alternates.extend(['World Trade Center', 'WTC Cortlandt', 'Cortlandt St'])
-        
-        if 'jay st' in name_lower:
-            alternates.extend(['Jay Street MetroTech', 'Jay St MetroTech', 'Jay Street'])
-        
-        if 'atlantic' in name_lower:
-            alternates.extend(['Atlantic Av Barclays Ctr', 'Atlantic Avenue', 'Barclays Center'])
-        
-        if 'herald sq' in name_lower or 'herald square' in name_lower:
-            alternates.extend(['34 St Herald Sq', 'Herald Square', '34 St Herald Square'])
-        
-        if 'union sq' in name_lower or 'union square' in name_lower:
-            alternates.extend(['14 St Union Sq', 'Union Square', '14 St Union Square'])
+        # Common variations - one scan finds every group the name mentions
+        found = {self.ALTERNATE_NAME_KEYS[m.group(0)] for m in self._ALTERNATE_NAME_RE.finditer(name_lower)}
+        alternates = [alt for group, names in self.ALTERNATE_NAMES.items() if group in found for alt in names]
         
         # Add version with "St" expanded to "Street"
         if ' st' in name_lower and 'street' not in name_lower:
@@ -265,10 +283,11 @@ class ElevatorEscalatorService:
             )
             
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             self.equipment_cache = data
             self.cache_timestamp = datetime.now()
+            self._build_equipment_index(data)
             
             equipment_count = len(data) if isinstance(data, list) else len(data.get('equipment', []))
             logger.info(f"Successfully fetched {equipment_count} pieces of equipment")
@@ -300,8 +319,12 @@ class ElevatorEscalatorService:
             response = self.session.get(self.OUTAGE_URL, timeout=10)
             response_time = time.time() - start_time
             
-            data = response.json()
-            outage_count = len(data) if isinstance(data, list) else len(data.get('outages', []))
+            data = orjson.loads(response.content)
+            
+            # Canonicalize both response shapes once into the set of out-of-service IDs
+            outages = data if isinstance(data, list) else data.get('outages', [])
+            outage_count = len(outages)
+            self.outage_ids = frozenset(intern(eid) for item in outages if (eid := item.get('equipment')))
             
             api_logger.log_api_call(
                 service_name='MTA_ELEVATOR_OUTAGES',
@@ -330,3 +353,12 @@ class ElevatorEscalatorService:
             )
             
             return {'error': error_msg}
+
+
+@lru_cache(maxsize=None)
+def get_elevator_service():
+    """
+    Process-wide ElevatorEscalatorService, built on first use
+    Callers share its equipment cache instead of each refetching the feed
+    """
+    return ElevatorEscalatorService()
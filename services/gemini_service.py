@@ -1,28 +1,10 @@
 import google.generativeai as genai
-from datetime import datetime
+import time
 
-class GeminiService:
-    """Service for interacting with Google Gemini AI"""
-    
-    def __init__(self, api_key):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('models/gemini-2.5-flash')
-    
-    def generate_response(self, user_query, mta_data):
-        """Generate a response using Gemini based on user query and MTA data"""
-        
-        # Build context from MTA data
-        context = self._build_context(mta_data)
-        
-        # Create prompt for Gemini
-        prompt = f"""You are an NYC Transit Assistant chatbot that provides real-time subway information. You have direct access to MTA real-time data feeds.
-
-User Question: {user_query}
+_PROMPT_HEADER = "You are an NYC Transit Assistant chatbot that provides real-time subway information. You have direct access to MTA real-time data feeds."
 
-Real-time MTA Data Available:
-{context}
-
-Instructions:
+# Static instruction block appended to every prompt
+_INSTRUCTIONS = """Instructions:
 - Provide helpful, conversational responses based ONLY on the real-time data provided above
 - If train arrival data is available, present it clearly with times and minutes away
 - If there are service alerts, explain them clearly and suggest alternatives if possible
@@ -39,12 +21,42 @@ Instructions:
 - For elevator queries with no alerts, be reassuring that elevators appear to be operational
 
 Response:"""
+
+
+class GeminiService:
+    """Service for interacting with Google Gemini AI"""
+    
+    def __init__(self, api_key):
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel('models/gemini-2.5-flash')
+    
+    def generate_response(self, user_query, mta_data):
+        """Generate a response using Gemini based on user query and MTA data"""
+        prompt = self._build_prompt(user_query, mta_data)
         
         try:
             response = self.model.generate_content(prompt)
             return response.text
         except Exception as e:
-            return f"I'm having trouble processing your request right now. The error is: {str(e)}. Please try rephrasing your question or ask about a different station or train line."
+            return self._error_message(e)
+    
+    def _build_prompt(self, user_query, mta_data):
+        """Build the Gemini prompt from the user query and MTA data"""
+        
+        # Build context from MTA data
+        context = self._build_context(mta_data)
+        
+        # Create prompt for Gemini
+        return "".join((
+            _PROMPT_HEADER,
+            "\n\nUser Question: ", user_query,
+            "\n\nReal-time MTA Data Available:\n", context,
+            "\n\n", _INSTRUCTIONS
+        ))
+    
+    def _error_message(self, e):
+        """User-facing message for a failed Gemini call"""
+        return f"I'm having trouble processing your request right now. The error is: {str(e)}. Please try rephrasing your question or ask about a different station or train line."
     
     def _build_context(self, mta_data):
         """Build context string from MTA data for Gemini"""
@@ -52,7 +64,7 @@ Response:"""
         context_parts = []
         
         context_parts.append(f"Query Type: {data_type}")
-        context_parts.append(f"Current Time: {datetime.now().strftime('%I:%M %p')}")
+        context_parts.append("Current Time: " + time.strftime('%I:%M %p'))
         
         if data_type == 'train_arrival':
             train_line = mta_data.get('train_line', 'Unknown')
@@ -74,10 +86,10 @@ Response:"""
                     )
             else:
                 context_parts.append("\nNo upcoming arrivals found in the next 30 minutes.")
-                context_parts.append(f"This could mean:")
+                context_parts.append("This could mean:")
                 context_parts.append(f"- The {train_line} train doesn't stop at {station}")
                 context_parts.append(f"- No {train_line} trains are currently scheduled")
-                context_parts.append(f"- There may be service changes or delays")
+                context_parts.append("- There may be service changes or delays")
                 context_parts.append(f"Suggestion: Check if this station serves the {train_line} line, or try asking about a different train line that stops here")
         
         elif data_type == 'alerts':
@@ -1,22 +1,90 @@
 import os
+import re
+import math
 import time
+import queue
+import hashlib
+import reprlib
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any
+import threading
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional, Any, AsyncIterator, Iterator, Tuple
 from datetime import datetime
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+import orjson
+from cachetools import TTLCache
+from langchain_core.agents import AgentAction
+from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain_core.tools import Tool
+from langchain.agents import AgentExecutor
+from langchain_core.tools import BaseTool, StructuredTool, Tool
 from typing_extensions import Annotated, TypedDict
 
 from config.logging_config import api_logger
 
 logger = logging.getLogger(__name__)
 
+# Agent answers are cached briefly since MTA data keeps changing; queries about
+# what is happening right now get the shorter TTL
+RESPONSE_CACHE_TTL = 60
+REALTIME_RESPONSE_CACHE_TTL = 15
+RESPONSE_CACHE_SIZE = 1024
+# Only the most recent history messages feed into the cache key
+RESPONSE_CACHE_HISTORY = 4
+# Messages kept per session (5 exchanges)
+HISTORY_MAX_MESSAGES = 10
+# Sessions kept in memory; the least recently used go first when full, and
+# a session idle for SESSION_IDLE_TTL seconds is dropped on the next access
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '10000'))
+SESSION_IDLE_TTL = 3600
+
+# Optional paraphrase matching: embed non-realtime queries and reuse a cached
+# answer from the same context when cosine similarity clears the threshold.
+# Off by default since every cache miss then costs an embedding call.
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE', '').lower() in ('1', 'true', 'yes')
+SEMANTIC_CACHE_THRESHOLD = 0.95
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+# Upper bound on concurrent tool calls across agent runs on the service loop
+TOOL_CONCURRENCY_LIMIT = int(os.getenv('TOOL_CONCURRENCY_LIMIT', '4'))
+_tool_semaphore = asyncio.Semaphore(TOOL_CONCURRENCY_LIMIT)
+
+_REALTIME_QUERY = re.compile(r'\b(now|next|currently|right now|today|tonight|delays?)\b')
+
+
+@lru_cache(maxsize=4)
+def _fmt_time(minute_epoch: int, fmt: str) -> str:
+    """Format the start of a given minute (minutes since the epoch)"""
+    return datetime.fromtimestamp(minute_epoch * 60).strftime(fmt)
+
+
+def _current_time(fmt: str = '%I:%M %p, %B %d, %Y') -> str:
+    """
+    Current time formatted to the minute, so prompts built within the same
+    minute are byte-identical
+    """
+    return _fmt_time(int(time.time()) // 60, fmt)
+
+
+# Tool output previews: strings are sliced directly; anything else goes
+# through reprlib, which stops expanding containers after a few items
+TOOL_OUTPUT_PREVIEW_CHARS = 200
+_preview_repr = reprlib.Repr()
+_preview_repr.maxstring = _preview_repr.maxother = TOOL_OUTPUT_PREVIEW_CHARS
+
+
+def _preview(observation: Any) -> str:
+    """Short preview of a tool observation without rendering all of it"""
+    if isinstance(observation, str):
+        return observation[:TOOL_OUTPUT_PREVIEW_CHARS]
+    return _preview_repr.repr(observation)[:TOOL_OUTPUT_PREVIEW_CHARS]
+
 
 class ConversationState(TypedDict):
     """State for conversation with memory"""
@@ -25,21 +93,209 @@ class ConversationState(TypedDict):
     user_query: str
 
 
+# Agent prompt, built once at import and shared by every agent executor
+_AGENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are an NYC Transit Assistant with access to real-time MTA data.
+
+                You have access to these tools to help answer user questions:
+                - get_train_arrivals: Get real-time train arrival times at a specific station
+                - get_service_alerts: Check for delays and service changes on train lines
+                - get_elevator_status: Check elevator/escalator availability at stations
+                - find_nearby_stations: Find stations by name (useful when user's input is unclear)
+                - plan_trip: Plan routes between two stations (USE THIS for "how do I get from X to Y" questions)
+                
+                Guidelines for using tools:
+                1. For "when is the next train" questions → use get_train_arrivals
+                2. For "any delays" or "service changes" → use get_service_alerts
+                3. For "is elevator working" → use get_elevator_status
+                4. For "how do I get from X to Y" → use plan_trip
+                5. If station name is unclear → use find_nearby_stations first
+                
+                When responding:
+                - Always call the appropriate tool(s) to get real-time data
+                - Present information clearly and conversationally
+                - Format times as "in X minutes" or "at HH:MM AM/PM"
+                - For trip planning, explain the full route including any transfers
+                - If equipment is out of service, suggest alternatives when possible
+                - NEVER suggest using other MTA apps - you ARE the app
+                
+                Current time: {current_time}"""),
+    MessagesPlaceholder(variable_name="chat_history", optional=True),
+    ("human", "{input}"),
+    MessagesPlaceholder(variable_name="agent_scratchpad")
+])
+
+
+# Prompt for the legacy tool-less generate_response
+_LEGACY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are an NYC Transit Assistant. Current time: {current_time}"),
+    MessagesPlaceholder(variable_name="chat_history", optional=True),
+    ("human", "MTA Data:\n{mta_context}\n\nUser Question: {user_query}")
+])
+
+
+# Prompt for answers to fast-routed queries: the tool has already run, the
+# model only phrases its output
+_FAST_ROUTE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are an NYC Transit Assistant. Current time: {current_time}. "
+               "Answer the user's question briefly using only the tool result provided."),
+    ("human", "Tool result:\n{tool_output}\n\nUser Question: {input}")
+])
+
+# Single-intent lookups that map straight onto one tool call, skipping the
+# agent's tool-selection round trip: (pattern, tool name, tool input builder)
+# A line is only taken from an explicit token: "the a train", or an uppercase
+# letter/digit ("A train", "6 train"), so the article in "a train" is not the A.
+# A station runs until a direction word or the end of the question.
+_FAST_ROUTE_LINE = r'\b(?P<line>(?<=\bthe\s)[a-z0-9]|(?-i:[A-Z0-9]))'
+_FAST_ROUTE_STATION = r'(?P<station>[^?!]+?)\s*(?:\b(?:to|toward|going)\b|[?!]|$)'
+_FAST_ROUTES = (
+    (
+        re.compile(r'\b(?:next|when)\b.*?' + _FAST_ROUTE_LINE + r'\s+trains?\b.*?\b(?:at|from)\s+' + _FAST_ROUTE_STATION, re.I),
+        'get_train_arrivals',
+        lambda m: {'train_line': m['line'].upper(), 'station_name': m['station']}
+    ),
+    (
+        re.compile(r'\b(?:elevators?|escalators?)\b.*?\bat\s+' + _FAST_ROUTE_STATION, re.I),
+        'get_elevator_status',
+        lambda m: {'station_name': m['station']}
+    ),
+    (
+        re.compile(r'\b(?:delays?|alerts?|service changes?)\b.*?' + _FAST_ROUTE_LINE + r'\s+(?:trains?|line)\b', re.I),
+        'get_service_alerts',
+        lambda m: {'train_line': m['line'].upper()}
+    ),
+)
+# Captured "stations" that refer back to the conversation, and joined
+# questions, are left to the agent
+_FAST_ROUTE_REFERENCES = frozenset({'there', 'here', 'it', 'that station', 'this station'})
+_FAST_ROUTE_COMPOUND = re.compile(r'\b(?:and|also|then|or)\b', re.I)
+
+
+def _fast_route(user_query: str, tools: List[Tool]):
+    """
+    Return (tool, tool_input) when exactly one fast route matches the query
+    and its tool is available, otherwise None
+    """
+    if _FAST_ROUTE_COMPOUND.search(user_query):
+        return None
+    
+    matches = [(name, build, match) for pattern, name, build in _FAST_ROUTES
+               if (match := pattern.search(user_query))]
+    if len(matches) != 1:
+        return None
+    
+    name, build, match = matches[0]
+    tool = next((tool for tool in tools if tool.name == name), None)
+    if tool is None:
+        return None
+    
+    tool_input = build(match)
+    station = tool_input.get('station_name')
+    if station is not None:
+        station = tool_input['station_name'] = station.strip().rstrip('.').strip()
+        if len(station) < 2 or station.lower() in _FAST_ROUTE_REFERENCES:
+            return None
+    return tool, tool_input
+
+
+# Lines and station phrases named in a query, for the response cache context
+_QUERY_LINE = re.compile(_FAST_ROUTE_LINE + r'\s+(?:trains?|line)\b', re.I)
+_QUERY_STATION = re.compile(r'\b(?:at|from|to|near)\s+(?P<station>[^?!.]+?)\s*(?=\b(?:to|toward|going|from)\b|[?!.]|$)', re.I)
+
+
+def _query_entities(user_query: str) -> List[str]:
+    """Sorted line and station tokens mentioned in a query"""
+    entities = {f"line:{m['line'].upper()}" for m in _QUERY_LINE.finditer(user_query)}
+    entities.update(f"station:{' '.join(m['station'].lower().split())}" for m in _QUERY_STATION.finditer(user_query))
+    return sorted(entities)
+
+# Tool calls of the agent run in the current context: {(tool, input): Task}.
+# Set around each agent run; asyncio tasks the run starts inherit it
+_run_tool_calls: ContextVar[Optional[Dict[tuple, asyncio.Future]]] = ContextVar('run_tool_calls', default=None)
+
+
+@contextmanager
+def _agent_run_scope():
+    """Give the agent run started inside the block its own tool call table"""
+    token = _run_tool_calls.set({})
+    try:
+        yield
+    finally:
+        _run_tool_calls.reset(token)
+
+
+async def _ainvoke_limited(tool: BaseTool, tool_input: Dict[str, Any]):
+    """Run a tool while holding the shared tool semaphore"""
+    async with _tool_semaphore:
+        return await tool.ainvoke(tool_input)
+
+
+def _limited_tool(tool: BaseTool) -> BaseTool:
+    """
+    Same tool, but its async calls share a semaphore
+    AgentExecutor.ainvoke already runs the tool calls of one step with
+    asyncio.gather (sync tools go to the default thread pool); this caps how
+    many MTA requests all in-flight agent runs can have open at once. Within
+    one run, repeated calls with the same input - in the same step or a
+    later one - share the first call's observation.
+    """
+    async def acall(**tool_input):
+        calls = _run_tool_calls.get()
+        if calls is None:
+            return await _ainvoke_limited(tool, tool_input)
+        
+        key = (tool.name, orjson.dumps(tool_input, option=orjson.OPT_SORT_KEYS, default=str))
+        call = calls.get(key)
+        if call is None:
+            call = calls[key] = asyncio.ensure_future(_ainvoke_limited(tool, tool_input))
+        else:
+            logger.info(f"Reusing {tool.name} result from earlier in this run")
+        return await call
+    
+    return StructuredTool.from_function(
+        func=getattr(tool, 'func', None),
+        coroutine=acall,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        return_direct=tool.return_direct
+    )
+
+
 class GeminiServiceLangChain:
     """
     Enhanced Gemini service using LangChain with Tool Calling
     """
     
-    def __init__(self, api_key: str, model: str = "models/gemini-2.5-flash"):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "models/gemini-2.5-flash",
+        default_tools: Optional[List[Tool]] = None,
+        max_tokens: int = 512,
+        max_iter: int = 3,
+        max_time: float = 15.0
+    ):
         """
         Initialize LangChain-based Gemini service
         
         Args:
             api_key: Google Gemini API key
             model: Model to use (gemini-1.5-flash, gemini-1.5-pro, etc.)
+            default_tools: Tool set to build an agent executor for up front
+            max_tokens: Output token cap per model call
+            max_iter: Agent steps allowed per query (tool calls in one step run together)
+            max_time: Seconds an agent run may take before it stops
         """
+        # Imported here rather than at module level - the Gemini client pulls
+        # in grpc and google-auth, which only matter once a service exists
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        
         self.api_key = api_key
         self.model_name = model
+        self.max_iter = max_iter
+        self.max_time = max_time
         
         # Initialize the LangChain Gemini model
         self.llm = ChatGoogleGenerativeAI(
@@ -47,19 +303,73 @@ class GeminiServiceLangChain:
             google_api_key=api_key,
             temperature=0.3,
             top_p=0.95,
-            max_output_tokens=2048,
-            convert_system_message_to_human=True
+            max_output_tokens=max_tokens,
+            convert_system_message_to_human=True,
+            max_retries=3,  # Backoff on 429/5xx from Gemini
+            timeout=30,
+            # gRPC keeps one HTTP/2 channel per client and multiplexes
+            # concurrent requests over it (this service is a singleton)
+            transport='grpc'
         )
         
+        # Legacy tool-less chain, composed once; callers pass every prompt field
+        self._legacy_chain = _LEGACY_PROMPT | self.llm | StrOutputParser()
+        self._fast_route_chain = _FAST_ROUTE_PROMPT | self.llm | StrOutputParser()
+        
         # Memory for conversation
-        self.conversation_history: Dict[str, List] = {}
+        # Messages are (role, content) tuples; MessagesPlaceholder turns them
+        # into HumanMessage/AIMessage only when a prompt is rendered
+        self.conversation_history = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_IDLE_TTL)
+        # History is read and appended on the agent loop and on request
+        # threads, and TTLCache is not thread-safe; the lock is held only for
+        # the copy or append, never across a model call
+        self._history_lock = threading.Lock()
+        # One lock per active session so its turns run in order on the
+        # agent loop; entries disappear once no turn holds the lock
+        self._session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        
+        # Agent executors by tool set (created when tools are first provided)
+        self._agent_executors: Dict[frozenset, AgentExecutor] = {}
+        
+        # Response caches keyed by _response_cache_key; TTLCache is not
+        # thread-safe, so access goes through the lock
+        self._response_cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+        self._realtime_response_cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=REALTIME_RESPONSE_CACHE_TTL)
+        self._response_cache_lock = threading.Lock()
+        # cache_key -> (context_key, unit query vector, cached payload)
+        self._semantic_cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+        self._embeddings = None
         
-        # Agent executor (will be created when tools are provided)
-        self.agent_executor = None
-        self.current_tools = None
+        # Long-lived event loop for async agent runs - the async Gemini
+        # client is bound to the loop it was created on
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name='gemini-agent-loop', daemon=True).start()
+        
+        # Open the client connection in the background; agent runs wait for
+        # it only while it is still in flight
+        self._warmed_up = asyncio.Event()
+        asyncio.run_coroutine_threadsafe(self._warmup(default_tools), self._loop)
         
         logger.info(f"LangChain Gemini service initialized with model: {model}")
     
+    async def _warmup(self, default_tools: Optional[List[Tool]]):
+        """Throwaway one-token call plus the default agent executor, if any"""
+        try:
+            if default_tools:
+                self._get_agent_executor(default_tools)
+            # Bypass the global LLM cache: once any worker has cached "ping" (a
+            # shared RedisCache in production) the call would be answered from
+            # the cache and never open the connection it is meant to pre-warm.
+            # model_copy is shallow, so the copy shares the underlying client
+            await self.llm.model_copy(update={'cache': False}).ainvoke(
+                "ping", generation_config={'max_output_tokens': 1}
+            )
+            logger.info("Gemini client warmed up")
+        except Exception as e:
+            logger.warning(f"Gemini warm-up failed: {str(e)}")
+        finally:
+            self._warmed_up.set()
+    
     def create_agent_with_tools(self, tools: List[Tool]) -> AgentExecutor:
         """
         Create an agent that can use tools to answer questions
@@ -70,54 +380,24 @@ class GeminiServiceLangChain:
         Returns:
             AgentExecutor that can use the tools
         """
-        logger.info(f"Creating agent with {len(tools)} tools")
+        from langchain.agents import create_tool_calling_agent
         
-        # Create prompt for agent
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are an NYC Transit Assistant with access to real-time MTA data.
-
-                You have access to these tools to help answer user questions:
-                - get_train_arrivals: Get real-time train arrival times at a specific station
-                - get_service_alerts: Check for delays and service changes on train lines
-                - get_elevator_status: Check elevator/escalator availability at stations
-                - find_nearby_stations: Find stations by name (useful when user's input is unclear)
-                - plan_trip: Plan routes between two stations (USE THIS for "how do I get from X to Y" questions)
-                
-                Guidelines for using tools:
-                1. For "when is the next train" questions → use get_train_arrivals
-                2. For "any delays" or "service changes" → use get_service_alerts
-                3. For "is elevator working" → use get_elevator_status
-                4. For "how do I get from X to Y" → use plan_trip
-                5. If station name is unclear → use find_nearby_stations first
-                
-                When responding:
-                - Always call the appropriate tool(s) to get real-time data
-                - Present information clearly and conversationally
-                - Format times as "in X minutes" or "at HH:MM AM/PM"
-                - For trip planning, explain the full route including any transfers
-                - If equipment is out of service, suggest alternatives when possible
-                - NEVER suggest using other MTA apps - you ARE the app
-                
-                Current time: {current_time}"""),
-                            MessagesPlaceholder(variable_name="chat_history", optional=True),
-                            ("human", "{input}"),
-                            MessagesPlaceholder(variable_name="agent_scratchpad")
-                        ])
+        logger.info(f"Creating agent with {len(tools)} tools")
         
         # Create agent with tool calling
         agent = create_tool_calling_agent(
             llm=self.llm,
             tools=tools,
-            prompt=prompt
+            prompt=_AGENT_PROMPT
         )
         
         # Create executor
         agent_executor = AgentExecutor(
             agent=agent,
-            tools=tools,
+            tools=[_limited_tool(tool) for tool in tools],
             verbose=True,  # Set to False in production
-            max_iterations=5,  # Allow up to 5 tool calls
-            max_execution_time=30,  # Timeout after 30 seconds
+            max_iterations=self.max_iter,
+            max_execution_time=self.max_time,
             handle_parsing_errors=True,
             return_intermediate_steps=True  # Return tool calls for logging
         )
@@ -141,6 +421,9 @@ class GeminiServiceLangChain:
         4. Synthesizes the results into a natural response
         5. Maintains conversation memory
         
+        The agent runs on the service's event loop, so when the model asks
+        for several tools in one step they are executed concurrently.
+        
         Args:
             user_query: User's question in natural language
             tools: List of available LangChain tools
@@ -149,31 +432,110 @@ class GeminiServiceLangChain:
         Returns:
             Dictionary with response and metadata
         """
+        future = asyncio.run_coroutine_threadsafe(
+            self.agenerate_response_with_tools(user_query, tools, session_id),
+            self._loop
+        )
+        return future.result()
+    
+    async def agenerate_response_with_tools(
+        self,
+        user_query: str,
+        tools: List[Tool],
+        session_id: str = "default"
+    ) -> Dict[str, Any]:
+        """
+        Async version of generate_response_with_tools
+        AgentExecutor.ainvoke runs the tool calls of each step with asyncio.gather
+        
+        Turns of the same session are serialized so each one sees the
+        previous answer in its history; different sessions run concurrently.
+        """
+        async with self._session_lock(session_id):
+            return await self._agenerate_response_with_tools(user_query, tools, session_id)
+    
+    async def _arun_fast_route(self, user_query: str, tool: Tool, tool_input: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Call the routed tool directly and have the model phrase its output
+        Returns the same shape as an agent run so the caller treats both alike
+        """
+        logger.info(f"Fast route: {tool.name}({tool_input})")
+        async with _tool_semaphore:
+            observation = await tool.ainvoke(tool_input)
+        
+        output = await self._fast_route_chain.ainvoke({
+            "input": user_query,
+            "tool_output": observation,
+            "current_time": _current_time()
+        })
+        return {
+            'output': output,
+            'intermediate_steps': [(AgentAction(tool=tool.name, tool_input=tool_input, log=''), observation)]
+        }
+    
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        """Return the lock for a session, creating it if no turn holds one"""
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._session_locks[session_id] = lock
+        return lock
+    
+    async def _agenerate_response_with_tools(
+        self,
+        user_query: str,
+        tools: List[Tool],
+        session_id: str
+    ) -> Dict[str, Any]:
+        """Run one agent turn; callers hold the session lock"""
         start_time = time.time()
         
         try:
-            # Create or update agent executor if tools changed
-            if (self.agent_executor is None or 
-                self.current_tools != tools or
-                len(self.current_tools) != len(tools)):
-                
-                logger.info("Creating new agent executor with updated tools")
-                self.agent_executor = self.create_agent_with_tools(tools)
-                self.current_tools = tools
-            
             # Get chat history for this session
-            chat_history = self.conversation_history.get(session_id, [])
+            chat_history = self._history_snapshot(session_id)
+            
+            # Repeat questions in the same context skip the agent entirely
+            cache, cache_key, context_key = self._response_cache_for(user_query, tools, chat_history)
+            with self._response_cache_lock:
+                cached = cache.get(cache_key)
+            
+            # Paraphrases of earlier non-realtime questions can reuse their answer
+            query_vector = None
+            if cached is None and SEMANTIC_CACHE_ENABLED and cache is self._response_cache:
+                query_vector = await self._aembed_query(user_query)
+                if query_vector is not None:
+                    # The scan is pure Python over every cached vector; keep it off the agent loop
+                    cached = await asyncio.get_running_loop().run_in_executor(
+                        None, self._semantic_cache_lookup, context_key, query_vector
+                    )
+            
+            if cached is not None:
+                response_time = time.time() - start_time
+                logger.info(f"Response cache hit (session: {session_id}): '{user_query}'")
+                self._record_exchange(session_id, user_query, cached['response'])
+                return {
+                    **cached,
+                    'response_time': response_time,
+                    'session_id': session_id,
+                    'cache_hit': True
+                }
+            
+            agent_executor = self._get_agent_executor(tools)
             
             logger.info(f"Processing query with tools (session: {session_id}): '{user_query}'")
-            logger.debug(f"Available tools: {[tool.name for tool in tools]}")
-            logger.debug(f"Chat history length: {len(chat_history)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Available tools: {[tool.name for tool in tools]}")
+                logger.debug(f"Chat history length: {len(chat_history)}")
             
-            # Invoke the agent - it will decide which tool(s) to call
-            result = self.agent_executor.invoke({
-                "input": user_query,
-                "chat_history": chat_history,
-                "current_time": datetime.now().strftime('%I:%M %p, %B %d, %Y')
-            })
+            await self._warmed_up.wait()
+            
+            routed = _fast_route(user_query, tools)
+            if routed is not None:
+                result = await self._arun_fast_route(user_query, *routed)
+            else:
+                # Invoke the agent - it will decide which tool(s) to call
+                with _agent_run_scope():
+                    result = await agent_executor.ainvoke(self._agent_inputs(user_query, chat_history))
             
             response_time = time.time() - start_time
             
@@ -191,53 +553,49 @@ class GeminiServiceLangChain:
                     tools_called.append({
                         'tool': tool_name,
                         'input': tool_input,
-                        'output_preview': str(observation)[:200]
+                        'output_preview': _preview(observation)
                     })
             
             logger.info(f"Agent called {len(tools_called)} tool(s): {[t['tool'] for t in tools_called]}")
             
             # Update conversation history
-            if session_id not in self.conversation_history:
-                self.conversation_history[session_id] = []
+            self._record_exchange(session_id, user_query, response_text)
             
-            self.conversation_history[session_id].append(
-                HumanMessage(content=user_query)
-            )
-            self.conversation_history[session_id].append(
-                AIMessage(content=response_text)
-            )
-            
-            # Keep only last 10 messages (5 exchanges)
-            if len(self.conversation_history[session_id]) > 10:
-                self.conversation_history[session_id] = self.conversation_history[session_id][-10:]
-            
-            # Log API call with tool details
-            api_logger.log_api_call(
-                service_name='GEMINI_AGENT_TOOLS',
-                endpoint=f'gemini/{self.model_name}',
-                method='INVOKE_WITH_TOOLS',
-                params={
-                    'session_id': session_id,
-                    'history_length': len(chat_history),
-                    'tools_available': [tool.name for tool in tools],
-                    'tools_called': [t['tool'] for t in tools_called]
-                },
-                response_status=200,
-                response_time=response_time,
-                response_data={
-                    'response_length': len(response_text),
-                    'num_tool_calls': len(tools_called)
-                }
-            )
+            # Log API call with tool details (skipped entirely when API logging is off)
+            if api_logger.enabled:
+                api_logger.log_api_call(
+                    service_name='GEMINI_AGENT_TOOLS',
+                    endpoint=f'gemini/{self.model_name}',
+                    method='INVOKE_WITH_TOOLS',
+                    params={
+                        'session_id': session_id,
+                        'history_length': len(chat_history),
+                        'tools_available': [tool.name for tool in tools],
+                        'tools_called': [t['tool'] for t in tools_called]
+                    },
+                    response_status=200,
+                    response_time=response_time,
+                    response_data={
+                        'response_length': len(response_text),
+                        'num_tool_calls': len(tools_called)
+                    }
+                )
             
             logger.info(f"Response generated successfully in {response_time:.2f}s")
             
+            payload = {'response': response_text, 'tools_called': tools_called}
+            with self._response_cache_lock:
+                cache[cache_key] = payload
+                if query_vector is not None:
+                    self._semantic_cache[cache_key] = (context_key, query_vector, payload)
+            
             # Return comprehensive result
             return {
                 'response': response_text,
                 'tools_called': tools_called,
                 'response_time': response_time,
-                'session_id': session_id
+                'session_id': session_id,
+                'cache_hit': False
             }
             
         except TimeoutError:
@@ -280,6 +638,211 @@ class GeminiServiceLangChain:
                 'error': str(e)
             }
     
+    def generate_response_with_tools_stream(
+        self,
+        user_query: str,
+        tools: List[Tool],
+        session_id: str = "default"
+    ) -> Iterator[str]:
+        """
+        Stream the agent's answer as it is generated
+        
+        Drives astream_response_with_tools on the service's event loop and
+        forwards its chunks through a queue as soon as they arrive.
+        
+        Args:
+            user_query: User's question in natural language
+            tools: List of available LangChain tools
+            session_id: Session ID for conversation memory
+        
+        Yields:
+            Response text chunks
+        """
+        token_queue = queue.Queue()
+        done = object()
+        
+        async def pump():
+            try:
+                async for chunk in self.astream_response_with_tools(user_query, tools, session_id):
+                    token_queue.put(chunk)
+            finally:
+                token_queue.put(done)
+        
+        asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        
+        while True:
+            chunk = token_queue.get()
+            if chunk is done:
+                break
+            yield chunk
+    
+    async def astream_response_with_tools(
+        self,
+        user_query: str,
+        tools: List[Tool],
+        session_id: str = "default"
+    ) -> AsyncIterator[str]:
+        """
+        Async version of generate_response_with_tools_stream
+        
+        Only chat model tokens are yielded; the final output is taken from
+        the agent's own chain end event for history and logging.
+        
+        Args:
+            user_query: User's question in natural language
+            tools: List of available LangChain tools
+            session_id: Session ID for conversation memory
+        
+        Yields:
+            Response text chunks
+        """
+        start_time = time.time()
+        agent_executor = self._get_agent_executor(tools)
+        
+        async with self._session_lock(session_id):
+            chat_history = self._history_snapshot(session_id)
+            
+            logger.info(f"Streaming query with tools (session: {session_id}): '{user_query}'")
+            
+            streamed = False
+            response_text = ''
+            await self._warmed_up.wait()
+            try:
+                with _agent_run_scope():
+                    async for event in agent_executor.astream_events(
+                        self._agent_inputs(user_query, chat_history),
+                        version='v2'
+                    ):
+                        kind = event['event']
+                        if kind == 'on_chat_model_stream':
+                            token = event['data']['chunk'].content
+                            # Tool-call chunks carry no text
+                            if token and isinstance(token, str):
+                                streamed = True
+                                yield token
+                        elif kind == 'on_chain_end' and not event['parent_ids']:
+                            response_text = event['data']['output'].get('output', '')
+            except Exception as e:
+                logger.error(f"Error in generate_response_with_tools_stream: {str(e)}", exc_info=True)
+                api_logger.log_api_call(
+                    service_name='GEMINI_AGENT_TOOLS',
+                    endpoint=f'gemini/{self.model_name}',
+                    method='STREAM_WITH_TOOLS',
+                    response_time=time.time() - start_time,
+                    error=str(e)
+                )
+                if not streamed:
+                    yield "I encountered an error while processing your request. Please try rephrasing your question or try again in a moment."
+                return
+            
+            # Cached LLM responses arrive without stream events
+            if not streamed and response_text:
+                yield response_text
+            
+            self._record_exchange(session_id, user_query, response_text)
+        
+        response_time = time.time() - start_time
+        
+        api_logger.log_api_call(
+            service_name='GEMINI_AGENT_TOOLS',
+            endpoint=f'gemini/{self.model_name}',
+            method='STREAM_WITH_TOOLS',
+            params={'session_id': session_id, 'history_length': len(chat_history)},
+            response_status=200,
+            response_time=response_time,
+            response_data={'response_length': len(response_text)}
+        )
+        
+        logger.info(f"Streamed response completed in {response_time:.2f}s")
+    
+    def _get_agent_executor(self, tools: List[Tool]) -> AgentExecutor:
+        """Return the agent executor for this tool set, building it on first use"""
+        key = frozenset(tool.name for tool in tools)
+        agent_executor = self._agent_executors.get(key)
+        if agent_executor is None:
+            logger.info("Creating new agent executor with updated tools")
+            agent_executor = self._agent_executors.setdefault(key, self.create_agent_with_tools(tools))
+        return agent_executor
+    
+    def _response_cache_for(self, user_query: str, tools: List[Tool], chat_history: List):
+        """
+        Pick the response cache for a query and build its key
+        The key covers the normalized query, available tools, recent history
+        and model, so the same question in a different context is a miss.
+        The context also holds the lines and stations the query names, so a
+        semantic hit can only reuse an answer about the same ones.
+        """
+        normalized_query = ' '.join(user_query.lower().split()).rstrip('?!.')
+        context_data = {
+            'entities': _query_entities(user_query),
+            'tools': sorted(tool.name for tool in tools),
+            'history': [content for _, content in chat_history[-RESPONSE_CACHE_HISTORY:]],
+            'model': self.model_name
+        }
+        context_key = hashlib.blake2b(orjson.dumps(context_data, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        cache_key = hashlib.blake2b(f"{context_key}:{normalized_query}".encode()).hexdigest()
+        
+        if _REALTIME_QUERY.search(normalized_query):
+            return self._realtime_response_cache, cache_key, context_key
+        return self._response_cache, cache_key, context_key
+    
+    async def _aembed_query(self, user_query: str) -> Optional[List[float]]:
+        """Unit-length embedding of a query, or None if the embedding call fails"""
+        try:
+            if self._embeddings is None:
+                from langchain_google_genai import GoogleGenerativeAIEmbeddings
+                self._embeddings = GoogleGenerativeAIEmbeddings(
+                    model=EMBEDDING_MODEL,
+                    google_api_key=self.api_key
+                )
+            vector = await self._embeddings.aembed_query(user_query)
+        except Exception as e:
+            logger.warning(f"Query embedding failed, skipping semantic cache: {str(e)}")
+            return None
+        
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+    
+    def _semantic_cache_lookup(self, context_key: str, query_vector: List[float]) -> Optional[Dict[str, Any]]:
+        """Cached payload of the most similar earlier query in the same context"""
+        best_score, best_payload = SEMANTIC_CACHE_THRESHOLD, None
+        with self._response_cache_lock:
+            entries = list(self._semantic_cache.values())
+        
+        for entry_context, vector, payload in entries:
+            if entry_context != context_key:
+                continue
+            score = math.fsum(a * b for a, b in zip(query_vector, vector))
+            if score >= best_score:
+                best_score, best_payload = score, payload
+        
+        if best_payload is not None:
+            logger.info(f"Semantic cache hit (similarity {best_score:.3f})")
+        return best_payload
+    
+    def _agent_inputs(self, user_query: str, chat_history: List) -> Dict[str, Any]:
+        """Build the input dict for an agent run"""
+        return {
+            "input": user_query,
+            "chat_history": chat_history,
+            "current_time": _current_time()
+        }
+    
+    def _history_snapshot(self, session_id: str) -> List:
+        """Copy of the session history, safe to use after the lock is released"""
+        with self._history_lock:
+            return list(self.conversation_history.get(session_id, ()))
+    
+    def _record_exchange(self, session_id: str, user_query: str, response_text: str):
+        """Append a question/answer pair to the session history"""
+        with self._history_lock:
+            # Bounded deque drops the oldest messages as new ones arrive
+            history = self.conversation_history.get(session_id) or deque(maxlen=HISTORY_MAX_MESSAGES)
+            history.append(('human', user_query))
+            history.append(('ai', response_text))
+            # Re-setting restarts the idle timer and marks the session recently used
+            self.conversation_history[session_id] = history
+    
     def generate_response(
         self, 
         user_query: str, 
@@ -296,56 +859,37 @@ class GeminiServiceLangChain:
         context = self._build_context(mta_data)
         
         # Simple response without tools
-        chat_history = self.conversation_history.get(session_id, [])
-        
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are an NYC Transit Assistant. Current time: {current_time}"),
-            MessagesPlaceholder(variable_name="chat_history", optional=True),
-            ("human", "MTA Data:\n{mta_context}\n\nUser Question: {user_query}")
-        ])
-        
-        chain = (
-            {
-                "user_query": RunnablePassthrough(),
-                "mta_context": RunnablePassthrough(),
-                "current_time": lambda _: datetime.now().strftime('%I:%M %p'),
-                "chat_history": lambda x: chat_history
-            }
-            | prompt
-            | self.llm
-            | StrOutputParser()
-        )
+        chat_history = self._history_snapshot(session_id)
         
-        response = chain.invoke({
+        response = self._legacy_chain.invoke({
             "user_query": user_query,
-            "mta_context": context
+            "mta_context": context,
+            "current_time": _current_time('%I:%M %p'),
+            "chat_history": chat_history
         })
         
         # Update history
-        if session_id not in self.conversation_history:
-            self.conversation_history[session_id] = []
-        
-        self.conversation_history[session_id].append(HumanMessage(content=user_query))
-        self.conversation_history[session_id].append(AIMessage(content=response))
+        self._record_exchange(session_id, user_query, response)
         
         return response
     
     def clear_history(self, session_id: str = "default"):
         """Clear conversation history for a session"""
-        if session_id in self.conversation_history:
-            del self.conversation_history[session_id]
+        with self._history_lock:
+            removed = self.conversation_history.pop(session_id, None)
+        if removed is not None:
             logger.info(f"Cleared history for session: {session_id}")
     
-    def get_history(self, session_id: str = "default") -> List:
-        """Get conversation history for a session"""
-        return self.conversation_history.get(session_id, [])
+    def get_history(self, session_id: str = "default") -> List[Tuple[str, str]]:
+        """Get conversation history for a session as (role, content) pairs"""
+        return self._history_snapshot(session_id)
     
     def _build_context(self, mta_data: Dict) -> str:
         """Build context string from MTA data (for legacy method)"""
         data_type = mta_data.get('type', 'general')
         context_parts = [
             f"Query Type: {data_type}",
-            f"Current Time: {datetime.now().strftime('%I:%M %p')}"
+            f"Current Time: {_current_time('%I:%M %p')}"
         ]
         
         # Add more context based on type
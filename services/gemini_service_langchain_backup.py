@@ -3,6 +3,7 @@ import time
 import logging
 from typing import Dict, List, Optional
 from datetime import datetime
+from itertools import islice
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
@@ -142,7 +143,7 @@ Current time: {current_time}"""
             chat_history = self.conversation_history.get(session_id, [])
             
             logger.info(f"Generating response for query type: {mta_data.get('type')}")
-            logger.debug(f"Session: {session_id}, History length: {len(chat_history)}")
+            logger.debug("Session: %s, History length: %d", session_id, len(chat_history))
             
             # Invoke the chain
             response = self.chain.invoke({
@@ -229,28 +230,28 @@ Current time: {current_time}"""
     def _build_context(self, mta_data: Dict) -> str:
         """Build context string from MTA data"""
         data_type = mta_data.get('type', 'general')
-        context_parts = []
-        
-        context_parts.append(f"Query Type: {data_type}")
-        context_parts.append(f"Current Time: {datetime.now().strftime('%I:%M %p')}")
+        context_parts = [
+            f"Query Type: {data_type}",
+            f"Current Time: {datetime.now().strftime('%I:%M %p')}"
+        ]
         
         if data_type == 'train_arrival':
             train_line = mta_data.get('train_line', 'Unknown')
             station = mta_data.get('station', 'Unknown')
             arrivals = mta_data.get('arrivals', [])
             
-            context_parts.append(f"\nTrain Line Requested: {train_line}")
-            context_parts.append(f"Station: {station}")
+            context_parts += (f"\nTrain Line Requested: {train_line}", f"Station: {station}")
             
             if isinstance(arrivals, dict) and 'error' in arrivals:
                 context_parts.append(f"Data Error: {arrivals['error']}")
             elif arrivals and len(arrivals) > 0:
                 context_parts.append(f"\nFound {len(arrivals)} upcoming trains:")
-                for i, arrival in enumerate(arrivals, 1):
-                    context_parts.append(
-                        f"{i}. {arrival['train_line']} train - {arrival['direction']} - "
-                        f"Arriving at {arrival['arrival_time']} ({arrival['minutes_away']} min away)"
-                    )
+                # One joined block instead of a list entry per arrival
+                context_parts.append("\n".join(
+                    f"{i}. {arrival['train_line']} train - {arrival['direction']} - "
+                    f"Arriving at {arrival['arrival_time']} ({arrival['minutes_away']} min away)"
+                    for i, arrival in enumerate(arrivals, 1)
+                ))
             else:
                 context_parts.append("\nNo upcoming arrivals found in the next 30 minutes.")
         
@@ -263,9 +264,11 @@ Current time: {current_time}"""
             else:
                 context_parts.append("\nSystem-wide Service Alerts:")
             
-            if alerts and len(alerts) > 0:
-                for i, alert in enumerate(alerts[:5], 1):
-                    context_parts.append(f"\nAlert {i}: {alert['header']}")
+            if alerts:
+                context_parts.append("\n".join(
+                    f"\nAlert {i}: {alert['header']}"
+                    for i, alert in enumerate(islice(alerts, 5), 1)
+                ))
             else:
                 context_parts.append("✓ No active service alerts - trains running normally!")
         
@@ -280,9 +283,11 @@ Current time: {current_time}"""
                 operational = elevator_status.get('operational', 0)
                 out_of_service = elevator_status.get('out_of_service', 0)
                 
-                context_parts.append(f"Total Equipment: {total}")
-                context_parts.append(f"✅ Operational: {operational}")
-                context_parts.append(f"❌ Out of Service: {out_of_service}")
+                context_parts += (
+                    f"Total Equipment: {total}",
+                    f"✅ Operational: {operational}",
+                    f"❌ Out of Service: {out_of_service}"
+                )
         
         return "\n".join(context_parts)
     
@@ -1,13 +1,85 @@
+import heapq
 import requests
-import json
 from datetime import datetime
 import time
 import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from operator import itemgetter
+from google.protobuf.internal import api_implementation
 from google.transit import gtfs_realtime_pb2
+from rapidfuzz import fuzz, process
 from config.logging_config import api_logger
+from config.http_config import get_http_session
 
 logger = logging.getLogger(__name__)
 
+# protobuf>=4 decodes through the upb C extension; the pure-Python fallback
+# is orders of magnitude slower on multi-MB GTFS-RT feeds
+if api_implementation.Type() == 'python':
+    logger.warning("protobuf is using the pure-Python backend; LIRR feed parsing will be slow")
+
+# Whether the generated bindings carry these fields at all - the same for
+# every message, so it is checked once rather than with hasattr per update
+_HAS_TRIP_HEADSIGN = 'trip_headsign' in gtfs_realtime_pb2.TripDescriptor.DESCRIPTOR.fields_by_name
+_HAS_PLATFORM_ID = 'platform_id' in gtfs_realtime_pb2.TripUpdate.StopTimeUpdate.DESCRIPTOR.fields_by_name
+
+
+class LIRRError(Exception):
+    """Raised by LIRRService when a station or feed lookup fails"""
+
+
+def _scan_arrivals(feed, stop_ids, now):
+    """
+    Walk a parsed LIRR feed and return (arrival_timestamp, destination, track)
+    for every upcoming stop at one of stop_ids
+    
+    Kept free of service state so the hot loop only touches locals and the
+    feed; this is the one place to swap in a compiled walker.
+    """
+    arrivals = []
+    append = arrivals.append
+    
+    for entity in feed.entity:
+        if not entity.HasField('trip_update'):
+            continue
+        trip = entity.trip_update
+        # Get destination from trip headsign (same for every stop of the trip)
+        destination = (trip.trip.trip_headsign if _HAS_TRIP_HEADSIGN else '') or 'Unknown'
+        
+        for stop_time_update in trip.stop_time_update:
+            if stop_time_update.stop_id not in stop_ids:
+                continue
+            
+            # Get arrival time
+            if stop_time_update.HasField('arrival'):
+                arrival_timestamp = stop_time_update.arrival.time
+            elif stop_time_update.HasField('departure'):
+                arrival_timestamp = stop_time_update.departure.time
+            else:
+                continue
+            
+            if arrival_timestamp < now:  # Skip past trains
+                continue
+            
+            append((arrival_timestamp, destination, stop_time_update.platform_id if _HAS_PLATFORM_ID else 'TBD'))
+    
+    return arrivals
+
+
+@dataclass(frozen=True, slots=True)
+class LIRRStation:
+    """One LIRR station; stop_ids holds the exact stop_id forms feed updates use"""
+    id: str
+    name: str
+    lines: tuple
+    stop_ids: frozenset = field(init=False)
+    
+    def __post_init__(self):
+        object.__setattr__(self, 'stop_ids', frozenset((self.id, self.id + 'N', self.id + 'S')))
+
 
 class LIRRService:
     """
@@ -19,57 +91,103 @@ class LIRRService:
     LIRR_FEED_URL = 'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/lirr%2Fgtfs-lirr'
     LIRR_ALERTS_URL = 'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/lirr%2Fgtfs-lirr-alerts'
     
+    # Feeds refresh about every 30s; every instance in the process shares
+    # the parsed copy for this long
+    FEED_TTL = 20
+    # url -> (parsed feed, fetched_at)
+    _feed_cache = {}
+    # One lock per feed so concurrent callers wait for a single download
+    _feed_locks = {LIRR_FEED_URL: threading.Lock(), LIRR_ALERTS_URL: threading.Lock()}
+    
     def __init__(self, api_key=None):
-        self.session = requests.Session()
+        self.session = get_http_session()
         
         # LIRR stations (major ones)
         self.lirr_stations = self._load_lirr_stations()
+        # Lowercased once so fuzzy matching can skip per-query preprocessing
+        self._station_names = tuple(self.lirr_stations)
+        self._station_names_lower = tuple(name.lower() for name in self._station_names)
+        # Agents ask about the same few stations over and over
+        self._match_station = lru_cache(maxsize=256)(self._match_station)
         
         logger.info("LIRR service initialized")
     
     def _load_lirr_stations(self):
         """Load LIRR station data"""
         # Major LIRR stations
-        return {
-            'Penn Station': {'id': '237', 'name': 'Penn Station', 'lines': ['All']},
-            'Jamaica': {'id': '139', 'name': 'Jamaica', 'lines': ['All']},
-            'Hicksville': {'id': '128', 'name': 'Hicksville', 'lines': ['Ronkonkoma', 'Port Jefferson', 'Oyster Bay']},
-            'Babylon': {'id': '18', 'name': 'Babylon', 'lines': ['Babylon']},
-            'Ronkonkoma': {'id': '211', 'name': 'Ronkonkoma', 'lines': ['Ronkonkoma']},
-            'Port Jefferson': {'id': '199', 'name': 'Port Jefferson', 'lines': ['Port Jefferson']},
-            'Huntington': {'id': '134', 'name': 'Huntington', 'lines': ['Port Jefferson']},
-            'Long Beach': {'id': '153', 'name': 'Long Beach', 'lines': ['Long Beach']},
-            'Far Rockaway': {'id': '101', 'name': 'Far Rockaway', 'lines': ['Far Rockaway']},
-            'Hempstead': {'id': '124', 'name': 'Hempstead', 'lines': ['Hempstead']},
-            'Oyster Bay': {'id': '188', 'name': 'Oyster Bay', 'lines': ['Oyster Bay']},
-            'Port Washington': {'id': '200', 'name': 'Port Washington', 'lines': ['Port Washington']},
-            'Atlantic Terminal': {'id': '8', 'name': 'Atlantic Terminal', 'lines': ['All']},
-            'Mineola': {'id': '167', 'name': 'Mineola', 'lines': ['All']},
-            'Freeport': {'id': '109', 'name': 'Freeport', 'lines': ['Babylon']},
-        }
+        stations = (
+            LIRRStation('237', 'Penn Station', ('All',)),
+            LIRRStation('139', 'Jamaica', ('All',)),
+            LIRRStation('128', 'Hicksville', ('Ronkonkoma', 'Port Jefferson', 'Oyster Bay')),
+            LIRRStation('18', 'Babylon', ('Babylon',)),
+            LIRRStation('211', 'Ronkonkoma', ('Ronkonkoma',)),
+            LIRRStation('199', 'Port Jefferson', ('Port Jefferson',)),
+            LIRRStation('134', 'Huntington', ('Port Jefferson',)),
+            LIRRStation('153', 'Long Beach', ('Long Beach',)),
+            LIRRStation('101', 'Far Rockaway', ('Far Rockaway',)),
+            LIRRStation('124', 'Hempstead', ('Hempstead',)),
+            LIRRStation('188', 'Oyster Bay', ('Oyster Bay',)),
+            LIRRStation('200', 'Port Washington', ('Port Washington',)),
+            LIRRStation('8', 'Atlantic Terminal', ('All',)),
+            LIRRStation('167', 'Mineola', ('All',)),
+            LIRRStation('109', 'Freeport', ('Babylon',)),
+        )
+        return {station.name: station for station in stations}
+    
+    def _get_feed(self, url, service_name):
+        """
+        Download and parse one GTFS-RT feed, reusing the parsed FeedMessage
+        within FEED_TTL
+        """
+        with self._feed_locks[url]:
+            cached = self._feed_cache.get(url)
+            if cached and time.monotonic() - cached[1] < self.FEED_TTL:
+                return cached[0]
+            
+            start_time = time.time()
+            # Read the body straight off the socket in one piece instead of
+            # letting requests assemble response.content from 10KB chunks
+            with self.session.get(url, timeout=10, stream=True) as response:
+                api_logger.log_api_call(
+                    service_name=service_name,
+                    endpoint=url,
+                    method='GET',
+                    response_status=response.status_code,
+                    response_time=time.time() - start_time
+                )
+                
+                response.raise_for_status()
+                response.raw.decode_content = True  # Undo any gzip transfer encoding
+                
+                # Parse GTFS Realtime protobuf
+                feed = gtfs_realtime_pb2.FeedMessage.FromString(response.raw.read())
+            
+            self._feed_cache[url] = (feed, time.monotonic())
+            return feed
     
     def find_station(self, query):
         """Find LIRR station by name (fuzzy matching)"""
-        from rapidfuzz import fuzz, process
-        
-        query_lower = query.lower()
-        
-        # Try exact match first
-        for station_name, station_data in self.lirr_stations.items():
-            if query_lower in station_name.lower() or station_name.lower() in query_lower:
-                return station_data
+        return self._match_station(query.lower())
+    
+    def _match_station(self, query_lower):
+        """Fuzzy lookup behind find_station; memoized per instance in __init__"""
+        # Partial words ("hicks", "ronk") score too low for the fuzzy pass, so
+        # a name containing the query, or contained in it, wins first
+        for i, name in enumerate(self._station_names_lower):
+            if query_lower in name or name in query_lower:
+                return self.lirr_stations[self._station_names[i]]
         
-        # Fuzzy match
-        station_names = list(self.lirr_stations.keys())
+        # token_set_ratio scores 100 when one name's words contain the other's
         result = process.extractOne(
-            query,
-            station_names,
-            scorer=fuzz.token_sort_ratio,
+            query_lower,
+            self._station_names_lower,
+            scorer=fuzz.token_set_ratio,
+            processor=None,
             score_cutoff=70
         )
         
         if result:
-            return self.lirr_stations[result[0]]
+            return self.lirr_stations[self._station_names[result[2]]]
         
         return None
     
@@ -83,73 +201,36 @@ class LIRRService:
         
         Returns:
             List of upcoming train arrivals
+        
+        Raises:
+            LIRRError: Unknown station or the feed could not be fetched/parsed
         """
         start_time = time.time()
         
+        station = self.find_station(station_name)
+        if not station:
+            raise LIRRError(f'Could not find LIRR station: {station_name}')
+        
         try:
+            logger.info(f"Fetching LIRR arrivals for {station.name}")
             
-            station = self.find_station(station_name)
-            if not station:
-                return {'error': f'Could not find LIRR station: {station_name}'}
+            feed = self._get_feed(self.LIRR_FEED_URL, 'LIRR_GTFS_REALTIME')
             
-            logger.info(f"Fetching LIRR arrivals for {station['name']}")
+            now = int(time.time())
+            arrivals = _scan_arrivals(feed, station.stop_ids, now)
             
-            response = self.session.get(self.LIRR_FEED_URL, timeout=10)
-            response_time = time.time() - start_time
+            logger.info(f"Found {len(arrivals)} LIRR arrivals at {station.name}")
             
-            api_logger.log_api_call(
-                service_name='LIRR_GTFS_REALTIME',
-                endpoint=self.LIRR_FEED_URL,
-                method='GET',
-                response_status=response.status_code,
-                response_time=response_time
-            )
-            
-            response.raise_for_status()
-            
-            # Parse GTFS Realtime protobuf
-            feed = gtfs_realtime_pb2.FeedMessage()
-            feed.ParseFromString(response.content)
-            
-            arrivals = []
-            station_id = station['id']
-            
-            for entity in feed.entity:
-                if entity.HasField('trip_update'):
-                    trip = entity.trip_update
-                    
-                    for stop_time_update in trip.stop_time_update:
-                        if station_id in stop_time_update.stop_id:
-                            # Get arrival time
-                            if stop_time_update.HasField('arrival'):
-                                arrival_timestamp = stop_time_update.arrival.time
-                            elif stop_time_update.HasField('departure'):
-                                arrival_timestamp = stop_time_update.departure.time
-                            else:
-                                continue
-                            
-                            arrival_datetime = datetime.fromtimestamp(arrival_timestamp)
-                            minutes_away = int((arrival_datetime - datetime.now()).total_seconds() / 60)
-                            
-                            if minutes_away < 0:  # Skip past trains
-                                continue
-                            
-                            # Get destination from trip headsign
-                            destination = trip.trip.trip_headsign if hasattr(trip.trip, 'trip_headsign') else 'Unknown'
-                            
-                            arrivals.append({
-                                'destination': destination,
-                                'arrival_time': arrival_datetime.strftime('%I:%M %p'),
-                                'minutes_away': minutes_away,
-                                'track': stop_time_update.platform_id if hasattr(stop_time_update, 'platform_id') else 'TBD'
-                            })
-            
-            # Sort by arrival time
-            arrivals.sort(key=lambda x: x['minutes_away'])
-            
-            logger.info(f"Found {len(arrivals)} LIRR arrivals at {station['name']}")
-            
-            return arrivals[:limit]
+            # Format only the soonest few
+            return [
+                {
+                    'destination': destination,
+                    'arrival_time': datetime.fromtimestamp(arrival_timestamp).strftime('%I:%M %p'),
+                    'minutes_away': (arrival_timestamp - now) // 60,
+                    'track': track
+                }
+                for arrival_timestamp, destination, track in heapq.nsmallest(limit, arrivals, key=itemgetter(0))
+            ]
             
         except requests.RequestException as e:
             response_time = time.time() - start_time
@@ -164,10 +245,10 @@ class LIRRService:
                 error=error_msg
             )
             
-            return {'error': error_msg}
+            raise LIRRError(error_msg) from e
         except Exception as e:
             logger.error(f"Unexpected error: {str(e)}", exc_info=True)
-            return {'error': str(e)}
+            raise LIRRError(str(e)) from e
     
     def get_service_alerts(self):
         """
@@ -175,48 +256,34 @@ class LIRRService:
         
         Returns:
             List of active service alerts
+        
+        Raises:
+            LIRRError: The feed could not be fetched/parsed
         """
         start_time = time.time()
         
         try:
-            
             logger.info("Fetching LIRR service alerts")
             
-            response = self.session.get(self.LIRR_ALERTS_URL, timeout=10)
-            response_time = time.time() - start_time
-            
-            api_logger.log_api_call(
-                service_name='LIRR_SERVICE_ALERTS',
-                endpoint=self.LIRR_ALERTS_URL,
-                method='GET',
-                response_status=response.status_code,
-                response_time=response_time
-            )
-            
-            response.raise_for_status()
-            
-            # Parse GTFS Realtime alerts
-            feed = gtfs_realtime_pb2.FeedMessage()
-            feed.ParseFromString(response.content)
+            feed = self._get_feed(self.LIRR_ALERTS_URL, 'LIRR_SERVICE_ALERTS')
             
             alerts = []
             for entity in feed.entity:
                 if entity.HasField('alert'):
                     alert = entity.alert
                     
-                    header = alert.header_text.translation[0].text if alert.header_text.translation else "No header"
-                    description = alert.description_text.translation[0].text if alert.description_text.translation else ""
+                    header_translations = alert.header_text.translation
+                    description_translations = alert.description_text.translation
+                    header = header_translations[0].text if header_translations else "No header"
+                    description = description_translations[0].text if description_translations else ""
                     
-                    # Get affected lines
-                    affected_lines = []
-                    for informed_entity in alert.informed_entity:
-                        if hasattr(informed_entity, 'route_id'):
-                            affected_lines.append(informed_entity.route_id)
+                    # Get affected lines (unset route_id reads as '')
+                    affected_lines = {ie.route_id for ie in alert.informed_entity if ie.route_id}
                     
                     alerts.append({
                         'header': header,
                         'description': description,
-                        'affected_lines': list(set(affected_lines))  # Remove duplicates
+                        'affected_lines': list(affected_lines)
                     })
             
             logger.info(f"Found {len(alerts)} LIRR service alerts")
@@ -234,11 +301,21 @@ class LIRRService:
                 error=str(e)
             )
             
-            return {'error': str(e)}
+            raise LIRRError(str(e)) from e
     
     def get_lines_at_station(self, station_name):
         """Get which LIRR lines serve a station"""
         station = self.find_station(station_name)
         if station:
-            return station['lines']
+            return station.lines
         return []
+
+
+@lru_cache(maxsize=None)
+def get_lirr_service():
+    """
+    Process-wide LIRRService, built on first use
+    Tool modules share it (and its station lookup cache) instead of each
+    constructing their own at import
+    """
+    return LIRRService(api_key=os.getenv('LIRR_API_KEY'))
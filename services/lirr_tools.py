@@ -1,14 +1,21 @@
 from langchain.agents import Tool
-from services.lirr_service import LIRRService
-import os
+from services.lirr_service import LIRRError, get_lirr_service
 import logging
+from operator import itemgetter
+from cachetools.func import ttl_cache
 
 logger = logging.getLogger(__name__)
 
-# Initialize LIRR service
-lirr_service = LIRRService(api_key=os.getenv('LIRR_API_KEY'))
+# Repeat tool calls with the same arguments within this window reuse the
+# previous result instead of refetching LIRR feeds (as in mta_tools)
+TOOL_CACHE_TTL = 30
+TOOL_CACHE_SIZE = 256
 
+# Fields of an arrival dict used in the formatted line, fetched in one call
+_LIRR_ARRIVAL_FIELDS = itemgetter('destination', 'arrival_time', 'minutes_away', 'track')
 
+
+@ttl_cache(maxsize=TOOL_CACHE_SIZE, ttl=TOOL_CACHE_TTL)
 def get_lirr_train_arrivals_func(station_name: str) -> str:
     """
     Get LIRR train arrival times at a station
@@ -22,30 +29,30 @@ def get_lirr_train_arrivals_func(station_name: str) -> str:
     try:
         logger.info(f"LIRR Tool called: get_lirr_train_arrivals({station_name})")
         
-        arrivals = lirr_service.get_train_arrivals(station_name)
-        
-        if isinstance(arrivals, dict) and 'error' in arrivals:
-            return f"Error: {arrivals['error']}"
+        arrivals = get_lirr_service().get_train_arrivals(station_name)
         
         if not arrivals:
             return f"No upcoming LIRR trains found at {station_name} in the next hour."
         
         # Format response
-        station = lirr_service.find_station(station_name)
-        station_display = station['name'] if station else station_name
+        station = get_lirr_service().find_station(station_name)
+        station_display = station.name if station else station_name
         
-        result = f"Upcoming LIRR trains at {station_display}:\n\n"
+        parts = [f"Upcoming LIRR trains at {station_display}:\n\n"]
         for i, arrival in enumerate(arrivals, 1):
-            track_info = f"Track {arrival['track']}" if arrival['track'] != 'TBD' else "Track TBD"
-            result += f"{i}. To {arrival['destination']} - {arrival['arrival_time']} ({arrival['minutes_away']} min) - {track_info}\n"
+            destination, arrival_time, minutes_away, track = _LIRR_ARRIVAL_FIELDS(arrival)
+            parts.append(f"{i}. To {destination} - {arrival_time} ({minutes_away} min) - Track {track}\n")
         
-        return result
+        return ''.join(parts)
         
+    except LIRRError as e:
+        return f"Error: {e}"
     except Exception as e:
         logger.error(f"Error in get_lirr_train_arrivals: {str(e)}", exc_info=True)
         return f"Error getting LIRR train times: {str(e)}"
 
 
+@ttl_cache(maxsize=TOOL_CACHE_SIZE, ttl=TOOL_CACHE_TTL)
 def get_lirr_service_alerts_func(input_str: str = "") -> str:
     """
     Get LIRR service alerts and delays
@@ -56,31 +63,30 @@ def get_lirr_service_alerts_func(input_str: str = "") -> str:
     try:
         logger.info("LIRR Tool called: get_lirr_service_alerts()")
         
-        alerts = lirr_service.get_service_alerts()
-        
-        if isinstance(alerts, dict) and 'error' in alerts:
-            return f"Error: {alerts['error']}"
+        alerts = get_lirr_service().get_service_alerts()
         
         if not alerts:
             return "✓ No LIRR service alerts at this time. Trains are running on schedule!"
         
         # Format response
-        result = f"LIRR Service Alerts ({len(alerts)} active):\n\n"
+        parts = [f"LIRR Service Alerts ({len(alerts)} active):\n\n"]
         
         for i, alert in enumerate(alerts[:5], 1):  # Show first 5
-            result += f"{i}. {alert['header']}\n"
+            parts.append(f"{i}. {alert['header']}\n")
             if alert['affected_lines']:
-                result += f"   Affected: {', '.join(alert['affected_lines'])}\n"
+                parts.append(f"   Affected: {', '.join(alert['affected_lines'])}\n")
             if alert['description']:
                 # Truncate long descriptions
                 desc = alert['description'][:200]
                 if len(alert['description']) > 200:
                     desc += "..."
-                result += f"   Details: {desc}\n"
-            result += "\n"
+                parts.append(f"   Details: {desc}\n")
+            parts.append("\n")
         
-        return result
+        return ''.join(parts)
         
+    except LIRRError as e:
+        return f"Error: {e}"
     except Exception as e:
         logger.error(f"Error in get_lirr_service_alerts: {str(e)}", exc_info=True)
         return f"Error getting LIRR alerts: {str(e)}"
@@ -99,20 +105,16 @@ def find_lirr_station_func(query: str) -> str:
     try:
         logger.info(f"LIRR Tool called: find_lirr_station({query})")
         
-        station = lirr_service.find_station(query)
+        station = get_lirr_service().find_station(query)
         
         if not station:
             # Show available stations
-            result = f"Could not find LIRR station matching '{query}'.\n\n"
-            result += "Major LIRR stations:\n"
-            for name in sorted(lirr_service.lirr_stations.keys())[:10]:
-                result += f"  - {name}\n"
-            return result
-        
-        result = f"Found LIRR station: {station['name']}\n"
-        result += f"Serves lines: {', '.join(station['lines'])}\n"
+            parts = [f"Could not find LIRR station matching '{query}'.\n\n", "Major LIRR stations:\n"]
+            for name in sorted(get_lirr_service().lirr_stations.keys())[:10]:
+                parts.append(f"  - {name}\n")
+            return ''.join(parts)
         
-        return result
+        return f"Found LIRR station: {station.name}\nServes lines: {', '.join(station.lines)}\n"
         
     except Exception as e:
         logger.error(f"Error in find_lirr_station: {str(e)}", exc_info=True)
@@ -1,10 +1,37 @@
+import heapq
 import requests
 from datetime import datetime
 import re
-import json
+import string
+import gzip
 import os
+import threading
+import time
+import orjson
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+from itertools import repeat
+from operator import itemgetter
 from google.transit import gtfs_realtime_pb2
 from rapidfuzz import fuzz, process
+from tenacity import retry, stop_after_attempt, stop_after_delay, wait_random_exponential, retry_if_exception
+from config.http_config import get_http_session
+
+
+def _is_transient_error(exc):
+    """Retry on connection problems, timeouts, 429 and 5xx - not other 4xx"""
+    if isinstance(exc, requests.HTTPError):
+        status = exc.response.status_code if exc.response is not None else None
+        return status == 429 or (status is not None and status >= 500)
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+@lru_cache(maxsize=None)
+def _keyword_pattern(keyword):
+    """Compiled "<keyword> <rest of question>" pattern, built once per keyword"""
+    return re.compile(f'{keyword}\\s+([^?]+)', re.IGNORECASE)
+
 
 class MTAService:
     """Enhanced service for interacting with MTA APIs"""
@@ -22,6 +49,73 @@ class MTAService:
     
     ALERTS_URL = 'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/camsys%2Fsubway-alerts'
     
+    # Train line -> FEED_URLS key
+    FEED_KEYS = {
+        'A': 'ace', 'C': 'ace', 'E': 'ace',
+        'B': 'bdfm', 'D': 'bdfm', 'F': 'bdfm', 'M': 'bdfm',
+        'G': 'g',
+        'J': 'jz', 'Z': 'jz',
+        'N': 'nqrw', 'Q': 'nqrw', 'R': 'nqrw', 'W': 'nqrw',
+        'L': 'l',
+        '1': '1234567', '2': '1234567', '3': '1234567',
+        '4': '1234567', '5': '1234567', '6': '1234567', '7': '1234567'
+    }
+    # Stop ID direction suffix -> description
+    DIRECTIONS = {'N': 'Uptown/Bronx/Queens', 'S': 'Downtown/Brooklyn'}
+    
+    # Feeds refresh about every 30s; parsed FeedMessages are shared by all
+    # callers for FEED_TTL seconds
+    FEED_TTL = 15
+    # A failed fetch is re-raised to callers for FEED_ERROR_TTL seconds, so
+    # requests queued on the lock fail fast instead of each retrying in turn
+    FEED_ERROR_TTL = 5
+    # url -> (parsed feed, fetched_at)
+    _feed_cache = {}
+    # url -> (exception, failed_at)
+    _feed_errors = {}
+    # One lock per feed so concurrent callers wait for a single download
+    _feed_locks = {url: threading.Lock() for url in (*FEED_URLS.values(), ALERTS_URL)}
+    # url -> (feed, route -> trip updates) for the feed currently cached
+    _route_index_cache = {}
+    
+    # Whole-token abbreviations applied by _normalize_station_name
+    NAME_REPLACEMENTS = {
+        'street': 'st',
+        'avenue': 'ave',
+        'boulevard': 'blvd',
+        'parkway': 'pkwy',
+        'square': 'sq',
+        'station': 'st',
+        'center': 'ctr',
+        'centre': 'ctr',
+        'saint': 'st',
+        'fort': 'ft',
+        'mount': 'mt',
+        'plaza': 'plz',
+    }
+    # "and" became "&", which was then stripped as punctuation - drop it outright
+    _DROPPED_TOKENS = frozenset({'and'})
+    # ASCII punctuation (hyphens and slashes included) becomes a space in one
+    # translate pass; non-ASCII names fall back to the regex
+    _PUNCTUATION_TO_SPACE = str.maketrans({c: ' ' for c in string.punctuation if c != '_'})
+    _SPECIAL_CHAR_RE = re.compile(r'[^\w\s]')
+    _STOP_WORDS = frozenset({'the', 'at', 'of', 'and', 'or', 'in', 'on', 'to', 'a', 'an'})
+    # Query patterns are compiled once here rather than per call
+    _TRAIN_LINE_PATTERNS = tuple(re.compile(p, re.IGNORECASE) for p in (
+        r'\b([ABCDEFGJLMNQRWZ])\s+(?:train|line)',
+        r'(?:train|line)\s+([ABCDEFGJLMNQRWZ])\b',
+        r'\b([1-7])\s+(?:train|line)',
+        r'(?:train|line)\s+([1-7])\b',
+        r'\b([ABCDEFGJLMNQRWZ])\b(?=\s+(?:from|at|to))',
+        r'the\s+([ABCDEFGJLMNQRWZ1-7])\s+',
+    ))
+    _TRAIN_REF_BEFORE_RE = re.compile(r'\b[ABCDEFGJLMNQRWZ1-7]\s+(?:train|line)\b', re.IGNORECASE)
+    _TRAIN_REF_AFTER_RE = re.compile(r'(?:train|line)\s+[ABCDEFGJLMNQRWZ1-7]\b', re.IGNORECASE)
+    _STATION_EXTRACT_PATTERNS = tuple(re.compile(p, re.IGNORECASE) for p in (
+        r'(?:at|from|to|near)\s+([^?\.!]+?)(?:\s+station)?(?:\?|$|at|from|to)',
+        r'(?:station)\s+([^?\.!]+?)(?:\?|$)',
+    ))
+    
     STATION_ALIASES = {
         'times sq': 'Times Sq',
         'times square': 'Times Sq',
@@ -43,9 +137,19 @@ class MTAService:
         'brooklyn bridge': 'Brooklyn Bridge',
         'city hall': 'City Hall',
     }
+    # All aliases in one pass, longest first so "times square" wins over "times sq"
+    _ALIAS_RE = re.compile('|'.join(map(re.escape, sorted(STATION_ALIASES, key=len, reverse=True))))
     
     def __init__(self):
-        self.session = requests.Session()
+        # Keep-alive connection pool shared by all feed requests
+        # (retries are handled by _fetch_feed, not the adapter)
+        self.session = get_http_session()
+        # Normalization is pure and sees the same few hundred station names
+        # (plus repeat queries) over and over
+        self._normalize_station_name = lru_cache(maxsize=4096)(self._normalize_station_name)
+        self._extract_keywords = lru_cache(maxsize=4096)(self._extract_keywords)
+        # Agents keep asking about the same popular stations
+        self._match_station = lru_cache(maxsize=2048)(self._match_station)
         self.stations = self._load_stations()
         self.route_info = self._load_route_info()
         # Pre-compute normalized station names for faster matching
@@ -55,8 +159,18 @@ class MTAService:
         """Load all subway stations from JSON file"""
         try:
             stations_file = os.path.join('data', 'subway_stations.json')
-            with open(stations_file, 'r') as f:
-                data = json.load(f)
+            gz_file = stations_file + '.gz'
+            # Prefer the compact gzip copy written alongside by the station
+            # scripts, unless the JSON has been edited since it was written
+            if os.path.exists(gz_file) and (
+                not os.path.exists(stations_file)
+                or os.path.getmtime(gz_file) >= os.path.getmtime(stations_file)
+            ):
+                with gzip.open(gz_file, 'rb') as f:
+                    data = orjson.loads(f.read())
+                    return data.get('stations', [])
+            with open(stations_file, 'rb') as f:
+                data = orjson.loads(f.read())
                 return data.get('stations', [])
         except FileNotFoundError:
             print("Warning: subway_stations.json not found. Using fallback data.")
@@ -66,29 +180,55 @@ class MTAService:
         """Load route information"""
         try:
             route_file = os.path.join('data', 'route_info.json')
-            with open(route_file, 'r') as f:
-                data = json.load(f)
+            with open(route_file, 'rb') as f:
+                data = orjson.loads(f.read())
                 return data.get('routes', {})
         except FileNotFoundError:
             return {}
     
     def _build_station_index(self):
         """Build index of normalized station names for faster matching"""
-        self.station_index = {}
-        for station in self.stations:
+        # Normalized name or keyword -> stations (always a list)
+        self.station_index = defaultdict(list)
+        # Normalized name -> station for exact matches (first station wins,
+        # like stations_by_name)
+        self.stations_by_normalized_name = {}
+        # Route -> stations and lowercase name -> station lookups
+        self.stations_by_route = defaultdict(list)
+        self.stations_by_name = {}
+        # Alias -> normalized standard name, substituted by find_station
+        self._normalized_aliases = {
+            alias: self._normalize_station_name(standard)
+            for alias, standard in self.STATION_ALIASES.items()
+        }
+        # Per-station values find_station scans, aligned with self.stations
+        # and built once here (tuples, since they never change afterwards)
+        self._station_names = tuple(s['stop_name'] for s in self.stations)
+        self._normalized_names = tuple(map(self._normalize_station_name, self._station_names))
+        self._station_keywords = tuple(map(self._extract_keywords, self._station_names))
+        # token_sort_ratio(q, name) == ratio(sorted tokens of q, sorted tokens of name),
+        # so sort each name's tokens once here instead of on every comparison
+        self._sorted_token_names = tuple(' '.join(sorted(name.split())) for name in self._station_names)
+        # Every substring of every station keyword -> indexes of stations
+        # having it, so a query keyword resolves with one dict lookup
+        self._keyword_substrings = defaultdict(set)
+        for i, station_keywords in enumerate(self._station_keywords):
+            for keyword in station_keywords:
+                for start in range(len(keyword)):
+                    for end in range(start + 1, len(keyword) + 1):
+                        self._keyword_substrings[keyword[start:end]].add(i)
+        for station, normalized, keywords in zip(self.stations, self._normalized_names, self._station_keywords):
+            for route in station.get('routes', ()):
+                self.stations_by_route[route.upper()].append(station)
+            self.stations_by_name.setdefault(station['stop_name'].lower(), station)
+            
             # Store both original and normalized versions
-            normalized = self._normalize_station_name(station['stop_name'])
-            self.station_index[normalized] = station
+            self.stations_by_normalized_name.setdefault(normalized, station)
+            self.station_index[normalized].append(station)
             
             # Also index by major keywords
-            keywords = self._extract_keywords(station['stop_name'])
             for keyword in keywords:
-                if keyword not in self.station_index:
-                    self.station_index[keyword] = []
-                if isinstance(self.station_index[keyword], list):
-                    self.station_index[keyword].append(station)
-                else:
-                    self.station_index[keyword] = [self.station_index[keyword], station]
+                self.station_index[keyword].append(station)
     
     def _normalize_station_name(self, name):
         """
@@ -101,48 +241,29 @@ class MTAService:
         if not name:
             return ""
         
-        # Convert to lowercase
+        # Convert to lowercase and turn special characters into spaces
         normalized = name.lower()
-        
-        # Replace common abbreviations and variations
-        replacements = {
-            'street': 'st',
-            'avenue': 'ave',
-            'boulevard': 'blvd',
-            'parkway': 'pkwy',
-            'square': 'sq',
-            'station': 'st',
-            'center': 'ctr',
-            'centre': 'ctr',
-            'saint': 'st',
-            'fort': 'ft',
-            'mount': 'mt',
-            'plaza': 'plz',
-            'and': '&',
-            '-': ' ',  # Convert hyphens to spaces for better token matching
-            '/': ' ',  # Convert slashes to spaces
-        }
-        
-        for old, new in replacements.items():
-            normalized = re.sub(r'\b' + old + r'\b', new, normalized)
-        
-        # Remove special characters except spaces and numbers
-        normalized = re.sub(r'[^\w\s]', ' ', normalized)
-        
-        # Remove extra whitespace
-        normalized = ' '.join(normalized.split())
-        
-        return normalized
+        if normalized.isascii():
+            normalized = normalized.translate(self._PUNCTUATION_TO_SPACE)
+        else:
+            normalized = self._SPECIAL_CHAR_RE.sub(' ', normalized)
+        
+        # Replace common abbreviations token by token; split/join also
+        # collapses extra whitespace
+        replacements = self.NAME_REPLACEMENTS
+        dropped = self._DROPPED_TOKENS
+        return ' '.join([
+            replacements.get(token, token)
+            for token in normalized.split() if token not in dropped
+        ])
     
     def _extract_keywords(self, name):
-        """Extract important keywords from station name"""
+        """Extract important keywords from station name (as a tuple, since results are cached)"""
         normalized = self._normalize_station_name(name)
         
         # Remove common filler words
-        stop_words = {'the', 'at', 'of', 'and', 'or', 'in', 'on', 'to', 'a', 'an'}
-        keywords = [w for w in normalized.split() if w not in stop_words and len(w) > 1]
-        
-        return keywords
+        stop_words = self._STOP_WORDS
+        return tuple(w for w in normalized.split() if len(w) > 1 and w not in stop_words)
     
     def find_station(self, query):
         """
@@ -155,72 +276,84 @@ class MTAService:
         if not self.stations or not query:
             return None
         
-        # Normalize the query
+        # Every strategy below is case-insensitive, so this is a safe cache key
+        return self._match_station(query.strip().lower())
+    
+    def _match_station(self, query):
+        """Multi-strategy lookup behind find_station; memoized per instance in __init__"""
+        # Fast path: exact station name
+        station = self.stations_by_name.get(query)
+        if station:
+            return station
+        
+        # Normalize the query; an exact normalized name skips the alias pass
+        # (which would rewrite "wtc cortlandt" and leave it to the fuzzy passes)
         normalized_query = self._normalize_station_name(query)
+        station = self.stations_by_normalized_name.get(normalized_query)
+        if station:
+            return station
         
         # Strategy 1: Check for known aliases
-        for alias, standard in self.STATION_ALIASES.items():
-            if alias in normalized_query:
-                normalized_query = normalized_query.replace(alias, self._normalize_station_name(standard))
+        aliases = self._normalized_aliases
+        aliased_query = self._ALIAS_RE.sub(lambda m: aliases[m.group(0)], normalized_query)
         
         # Strategy 2: Try exact match on normalized names
-        if normalized_query in self.station_index:
-            result = self.station_index[normalized_query]
-            if isinstance(result, dict):
-                return result
+        if aliased_query != normalized_query:
+            normalized_query = aliased_query
+            station = self.stations_by_normalized_name.get(normalized_query)
+            if station:
+                return station
         
         # Strategy 3: Try keyword-based matching for partial queries
         query_keywords = self._extract_keywords(query)
-        keyword_matches = []
-        
-        for station in self.stations:
-            station_keywords = self._extract_keywords(station['stop_name'])
-            # Check if all query keywords are in station keywords
-            if all(any(qk in sk for sk in station_keywords) for qk in query_keywords):
-                keyword_matches.append(station)
+        sorted_query = ' '.join(sorted(query.split()))
+        sorted_names = self._sorted_token_names
+        
+        # Station index -> pre-sorted name, for stations where all query
+        # keywords appear in the station keywords
+        if query_keywords:
+            substrings = self._keyword_substrings
+            candidates = set.intersection(*(substrings.get(qk, set()) for qk in query_keywords))
+            keyword_matches = {i: sorted_names[i] for i in sorted(candidates)}
+        else:
+            keyword_matches = dict(enumerate(sorted_names))
         
-        # If we found keyword matches, use fuzzy matching on those
+        # If we found keyword matches, use fuzzy matching on those.
+        # token_sort rather than token_set: token_set scores 100 whenever one
+        # side's tokens are a subset of the other's ("8 ave" vs "Avenue H")
         if keyword_matches:
-            station_names = [s['stop_name'] for s in keyword_matches]
             result = process.extractOne(
-                query,
-                station_names,
-                scorer=fuzz.token_sort_ratio,
+                sorted_query,
+                keyword_matches,
+                scorer=fuzz.ratio,
                 score_cutoff=60  # Lower threshold for keyword matches
             )
             if result:
-                for station in keyword_matches:
-                    if station['stop_name'] == result[0]:
-                        return station
+                return self.stations[result[2]]
         
-        # Strategy 4: Fuzzy match with token_sort_ratio (ignores word order)
-        station_names = [s['stop_name'] for s in self.stations]
+        # Strategy 4: Fuzzy match ignoring word order (token_sort_ratio)
         result = process.extractOne(
-            query,
-            station_names,
-            scorer=fuzz.token_sort_ratio,
+            sorted_query,
+            sorted_names,
+            scorer=fuzz.ratio,
             score_cutoff=70
         )
         
         if result:
-            for station in self.stations:
-                if station['stop_name'] == result[0]:
-                    return station
+            # extractOne reports the index of the (first) best match
+            return self.stations[result[2]]
         
         # Strategy 5: More lenient partial matching for very short queries
         if len(query.split()) <= 2:
             result = process.extractOne(
                 normalized_query,
-                [self._normalize_station_name(s['stop_name']) for s in self.stations],
+                self._normalized_names,
                 scorer=fuzz.partial_ratio,
                 score_cutoff=80
             )
             
             if result:
-                # Find original station
-                for station in self.stations:
-                    if self._normalize_station_name(station['stop_name']) == result[0]:
-                        return station
+                return self.stations[result[2]]
         
         return None
     
@@ -312,57 +445,70 @@ class MTAService:
                 return {'error': f'Unknown train line: {train_line}'}
             
             feed_url = self.FEED_URLS.get(feed_key)
-            response = self.session.get(feed_url, timeout=10)
-            response.raise_for_status()
-            
-            feed = gtfs_realtime_pb2.FeedMessage()
-            feed.ParseFromString(response.content)
+            target_route = train_line.strip().upper()
+            trip_updates = self._get_trip_updates_by_route(feed_url).get(target_route, ())
             
             arrivals = []
-            station_ids = station.get('gtfs_stop_ids', [])
+            # Feed stop IDs are the station's base ID plus an N/S direction
+            # suffix, so exact set membership replaces the substring scan
+            station_ids = frozenset(
+                sid + suffix
+                for sid in station.get('gtfs_stop_ids', ())
+                for suffix in ('', 'N', 'S')
+            )
+            now = time.time()
             
-            for entity in feed.entity:
-                if entity.HasField('trip_update'):
-                    trip = entity.trip_update.trip
-                    
-                    # Robust route matching
-                    if hasattr(trip, 'route_id') and trip.route_id:
-                        trip_route = trip.route_id.strip().upper()
-                        target_route = train_line.strip().upper()
+            # (minutes_away, arrival timestamp, stop_id) per upcoming stop;
+            # the display dicts are only built for the trains we return
+            for trip_update in trip_updates:
+                for stop_time_update in trip_update.stop_time_update:
+                    # Check matches
+                    if stop_time_update.stop_id in station_ids:
+                        # Use arrival time, fallback to departure time
+                        arrival_time = None
+                        if stop_time_update.HasField('arrival'):
+                            arrival_time = stop_time_update.arrival.time
+                        elif stop_time_update.HasField('departure'):
+                            arrival_time = stop_time_update.departure.time
                         
-                        if trip_route == target_route:
-                            for stop_time_update in entity.trip_update.stop_time_update:
-                                # Check matches
-                                if any(sid in stop_time_update.stop_id for sid in station_ids):
-                                    # Use arrival time, fallback to departure time
-                                    arrival_time = None
-                                    if stop_time_update.HasField('arrival'):
-                                        arrival_time = stop_time_update.arrival.time
-                                    elif stop_time_update.HasField('departure'):
-                                        arrival_time = stop_time_update.departure.time
-                                    
-                                    if arrival_time:
-                                        arrival_datetime = datetime.fromtimestamp(arrival_time)
-                                        # Calculate difference in minutes
-                                        diff = (arrival_datetime - datetime.now())
-                                        minutes_away = int(diff.total_seconds() / 60)
-                                        
-                                        # Only show future/recent trains (allow -1 min for slight delay)
-                                        if minutes_away >= -1:
-                                            arrivals.append({
-                                                'train_line': trip_route,
-                                                'direction': self._get_direction(stop_time_update.stop_id),
-                                                'arrival_time': arrival_datetime.strftime('%I:%M %p'),
-                                                'minutes_away': max(0, minutes_away),
-                                                'stop_id': stop_time_update.stop_id
-                                            })
+                        if arrival_time:
+                            # Calculate difference in minutes
+                            minutes_away = int((arrival_time - now) / 60)
+                            
+                            # Only show future/recent trains (allow -1 min for slight delay)
+                            if minutes_away >= -1:
+                                arrivals.append((max(0, minutes_away), arrival_time, stop_time_update.stop_id))
             
-            arrivals.sort(key=lambda x: x['minutes_away'])
-            return arrivals[:5]
+            # Same result as sort-then-slice, without sorting the whole list
+            return [
+                {
+                    'train_line': target_route,
+                    'direction': self._get_direction(stop_id),
+                    'arrival_time': datetime.fromtimestamp(arrival_time).strftime('%I:%M %p'),
+                    'minutes_away': minutes_away,
+                    'stop_id': stop_id
+                }
+                for minutes_away, arrival_time, stop_id in heapq.nsmallest(5, arrivals, key=itemgetter(0))
+            ]
             
         except Exception as e:
             return {'error': str(e)}
     
+    def get_arrivals_for_routes(self, routes, station):
+        """
+        Arrivals for several train lines at one station, keyed by line
+        Each distinct feed is downloaded once (in parallel when the lines span
+        several feeds) and the per-line lookups then share the cached parse
+        """
+        urls = {self.FEED_URLS[key] for key in map(self._get_feed_key, routes) if key}
+        if len(urls) > 1:
+            with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+                # Only warms the feed cache; a failed fetch is retried and
+                # reported by get_train_arrivals below
+                wait([executor.submit(self._get_feed, url) for url in urls])
+        
+        return {route: self.get_train_arrivals(route, station) for route in routes}
+    
     def get_vehicle_positions(self, train_line=None):
         """Get live vehicle positions for trains"""
         positions = []
@@ -377,75 +523,76 @@ class MTAService:
                 # Check major lines by default if no specific line req (limit to avoid too many requests if needed, but here we do all)
                 feeds_to_check = list(self.FEED_URLS.keys())
 
-            for key in feeds_to_check:
-                url = self.FEED_URLS[key]
-                try:
-                    response = self.session.get(url, timeout=5)
-                    if response.status_code != 200:
-                        continue
-                        
-                    feed = gtfs_realtime_pb2.FeedMessage()
-                    feed.ParseFromString(response.content)
-                    
-                    for entity in feed.entity:
-                        if entity.HasField('vehicle'):
-                            v = entity.vehicle
-                            if not v.trip.route_id:
-                                continue
-                                
-                            # Filter if specific line requested
-                            if train_line and v.trip.route_id.upper() != train_line.upper():
-                                continue
-
-                            positions.append({
-                                'id': entity.id,
-                                'route_id': v.trip.route_id,
-                                'lat': v.position.latitude,
-                                'lon': v.position.longitude,
-                                'bearing': v.position.bearing,
-                                'current_status': v.current_status, # 0=INCOMING, 1=STOPPED_AT, 2=IN_TRANSIT_TO
-                                'stop_id': v.stop_id,
-                                'timestamp': v.timestamp
-                            })
-                except Exception as e:
-                    print(f"Error fetching feed {key}: {e}")
-                    continue
+            # The feeds are independent, so fetch them side by side over the
+            # pooled session; total time is roughly that of the slowest feed
+            route = train_line.upper() if train_line else None
+            with ThreadPoolExecutor(max_workers=max(1, len(feeds_to_check))) as executor:
+                results = executor.map(self._fetch_vehicle_feed, feeds_to_check, repeat(route))
+                for feed_positions in results:
+                    positions.extend(feed_positions)
                     
             return positions
 
         except Exception as e:
             return {'error': str(e)}
 
+    def _fetch_vehicle_feed(self, key, route=None):
+        """Vehicle positions from one feed, optionally limited to one route"""
+        positions = []
+        try:
+            feed = self._get_feed(self.FEED_URLS[key], timeout=5)
+            
+            for entity in feed.entity:
+                if entity.HasField('vehicle'):
+                    v = entity.vehicle
+                    if not v.trip.route_id:
+                        continue
+                        
+                    # Filter if specific line requested
+                    if route and v.trip.route_id.upper() != route:
+                        continue
+
+                    positions.append({
+                        'id': entity.id,
+                        'route_id': v.trip.route_id,
+                        'lat': v.position.latitude,
+                        'lon': v.position.longitude,
+                        'bearing': v.position.bearing,
+                        'current_status': v.current_status, # 0=INCOMING, 1=STOPPED_AT, 2=IN_TRANSIT_TO
+                        'stop_id': v.stop_id,
+                        'timestamp': v.timestamp
+                    })
+        except Exception as e:
+            print(f"Error fetching feed {key}: {e}")
+        return positions
+
     def get_service_alerts(self, train_line=None):
         """Get service alerts"""
         try:
-            response = self.session.get(self.ALERTS_URL, timeout=10)
-            response.raise_for_status()
-            
-            feed = gtfs_realtime_pb2.FeedMessage()
-            feed.ParseFromString(response.content)
+            feed = self._get_feed(self.ALERTS_URL)
             
             alerts = []
+            target = train_line.upper() if train_line else None
             for entity in feed.entity:
                 if entity.HasField('alert'):
                     alert = entity.alert
+                    # route_id is always defined on the message (empty when unset),
+                    # so read it once per informed entity without hasattr
+                    route_ids = [ie.route_id for ie in alert.informed_entity]
                     
-                    if train_line:
-                        route_match = False
-                        for informed_entity in alert.informed_entity:
-                            if hasattr(informed_entity, 'route_id') and informed_entity.route_id.upper() == train_line.upper():
-                                route_match = True
-                                break
-                        if not route_match:
-                            continue
+                    # Skip unrelated alerts before touching the text fields
+                    if target and not any(route_id.upper() == target for route_id in route_ids):
+                        continue
                     
-                    header = alert.header_text.translation[0].text if alert.header_text.translation else "No header"
-                    description = alert.description_text.translation[0].text if alert.description_text.translation else "No description"
+                    header_translations = alert.header_text.translation
+                    description_translations = alert.description_text.translation
+                    header = header_translations[0].text if header_translations else "No header"
+                    description = description_translations[0].text if description_translations else "No description"
                     
                     alerts.append({
                         'header': header,
                         'description': description,
-                        'affected_routes': [ie.route_id for ie in alert.informed_entity if hasattr(ie, 'route_id')]
+                        'affected_routes': route_ids
                     })
             
             return alerts
@@ -453,35 +600,80 @@ class MTAService:
         except Exception as e:
             return {'error': str(e)}
     
+    def _get_feed(self, url, timeout=10):
+        """Parsed GTFS-Realtime feed, reused within FEED_TTL"""
+        with self._feed_locks[url]:
+            cached = self._feed_cache.get(url)
+            if cached and time.monotonic() - cached[1] < self.FEED_TTL:
+                return cached[0]
+            failed = self._feed_errors.get(url)
+            if failed and time.monotonic() - failed[1] < self.FEED_ERROR_TTL:
+                raise failed[0]
+            
+            try:
+                feed = self._fetch_feed(url, timeout=timeout)
+            except Exception as e:
+                self._feed_errors[url] = (e, time.monotonic())
+                raise
+            self._feed_errors.pop(url, None)
+            self._feed_cache[url] = (feed, time.monotonic())
+            return feed
+    
+    def _get_trip_updates_by_route(self, url):
+        """
+        Trip updates in a feed grouped by normalized route ID
+        Built once per parsed feed, so repeat lookups skip other routes' entities
+        """
+        feed = self._get_feed(url)
+        cached = self._route_index_cache.get(url)
+        if cached and cached[0] is feed:
+            return cached[1]
+        
+        by_route = defaultdict(list)
+        for entity in feed.entity:
+            if entity.HasField('trip_update'):
+                route_id = entity.trip_update.trip.route_id
+                if route_id:
+                    by_route[route_id.strip().upper()].append(entity.trip_update)
+        
+        self._route_index_cache[url] = (feed, by_route)
+        return by_route
+    
+    @retry(
+        stop=stop_after_attempt(4) | stop_after_delay(8),
+        wait=wait_random_exponential(multiplier=1, max=4),
+        retry=retry_if_exception(_is_transient_error),
+        reraise=True
+    )
+    def _fetch_feed(self, url, timeout=10):
+        """
+        Fetch and parse a GTFS-Realtime feed
+        Transient failures are retried with jittered exponential backoff
+        """
+        response = self.session.get(url, timeout=timeout)
+        response.raise_for_status()
+        
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.ParseFromString(response.content)
+        return feed
+    
     def get_elevator_status(self, station):
         """Get elevator status using dedicated elevator service"""
-        from services.elevator_service import ElevatorEscalatorService
-        
-        # Initialize elevator service with API key
-        elevator_service = ElevatorEscalatorService()
+        from services.elevator_service import get_elevator_service
         
         if not station:
             return {'message': 'Please specify a station'}
         
         # Get equipment status for this station
-        status = elevator_service.get_station_equipment_status(station['stop_name'])
+        status = get_elevator_service().get_station_equipment_status(station['stop_name'])
         
         return status
 
     
     def _extract_train_line(self, query):
         """Extract train line from query"""
-        patterns = [
-            r'\b([ABCDEFGJLMNQRWZ])\s+(?:train|line)',
-            r'(?:train|line)\s+([ABCDEFGJLMNQRWZ])\b',
-            r'\b([1-7])\s+(?:train|line)',
-            r'(?:train|line)\s+([1-7])\b',
-            r'\b([ABCDEFGJLMNQRWZ])\b(?=\s+(?:from|at|to))',
-            r'the\s+([ABCDEFGJLMNQRWZ1-7])\s+',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, query, re.IGNORECASE)
+        for pattern in self._TRAIN_LINE_PATTERNS:
+            match = pattern.search(query)
             if match:
                 return match.group(1).upper()
         
@@ -490,17 +682,12 @@ class MTAService:
     def _extract_station_text(self, query):
         """Extract station reference from query with better context awareness"""
         # Remove train line references first
-        query_clean = re.sub(r'\b[ABCDEFGJLMNQRWZ1-7]\s+(?:train|line)\b', '', query, flags=re.IGNORECASE)
-        query_clean = re.sub(r'(?:train|line)\s+[ABCDEFGJLMNQRWZ1-7]\b', '', query_clean, flags=re.IGNORECASE)
+        query_clean = self._TRAIN_REF_BEFORE_RE.sub('', query)
+        query_clean = self._TRAIN_REF_AFTER_RE.sub('', query_clean)
         
         # Common patterns for station extraction
-        patterns = [
-            r'(?:at|from|to|near)\s+([^?\.!]+?)(?:\s+station)?(?:\?|$|at|from|to)',
-            r'(?:station)\s+([^?\.!]+?)(?:\?|$)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, query_clean, re.IGNORECASE)
+        for pattern in self._STATION_EXTRACT_PATTERNS:
+            match = pattern.search(query_clean)
             if match:
                 return match.group(1).strip()
         
@@ -517,33 +704,25 @@ class MTAService:
     def _extract_text_after_keywords(self, query, keywords):
         """Extract text after specific keywords"""
         for keyword in keywords:
-            pattern = f'{keyword}\\s+([^?]+)'
-            match = re.search(pattern, query, re.IGNORECASE)
+            match = _keyword_pattern(keyword).search(query)
             if match:
                 return match.group(1).strip()
         return None
     
     def _get_feed_key(self, train_line):
         """Determine which feed to use for a given train line"""
-        train_line = train_line.upper()
-        
-        feed_mapping = {
-            'A': 'ace', 'C': 'ace', 'E': 'ace',
-            'B': 'bdfm', 'D': 'bdfm', 'F': 'bdfm', 'M': 'bdfm',
-            'G': 'g',
-            'J': 'jz', 'Z': 'jz',
-            'N': 'nqrw', 'Q': 'nqrw', 'R': 'nqrw', 'W': 'nqrw',
-            'L': 'l',
-            '1': '1234567', '2': '1234567', '3': '1234567',
-            '4': '1234567', '5': '1234567', '6': '1234567', '7': '1234567'
-        }
-        
-        return feed_mapping.get(train_line)
+        return self.FEED_KEYS.get(train_line.upper())
     
     def _get_direction(self, stop_id):
         """Determine direction from stop ID"""
-        if stop_id.endswith('N'):
-            return 'Uptown/Bronx/Queens'
-        elif stop_id.endswith('S'):
-            return 'Downtown/Brooklyn'
-        return 'Unknown'
+        return self.DIRECTIONS.get(stop_id[-1:], 'Unknown')
+
+
+@lru_cache(maxsize=None)
+def get_mta_service():
+    """
+    Process-wide MTAService, built on first use
+    The Flask routes and the agent tools share it (and its station and feed
+    caches) instead of each constructing their own
+    """
+    return MTAService()
@@ -1,19 +1,78 @@
 from langchain_core.tools import tool
 from typing import Optional, List, Dict
 import logging
-from services.lirr_service import LIRRService
-from services.mta_service import MTAService
-from services.elevator_service import ElevatorEscalatorService
+import threading
+from collections import defaultdict
+from functools import lru_cache, wraps
+from itertools import islice, product
+from operator import itemgetter
+from cachetools import TTLCache
+from cachetools.keys import hashkey
+from rapidfuzz import fuzz, process, utils
+from services.lirr_service import LIRRError, get_lirr_service
+from services.mta_service import get_mta_service
+from services.elevator_service import get_elevator_service
 import os
 
 logger = logging.getLogger(__name__)
 
-# Initialize services
-mta_service = MTAService()
-elevator_service = ElevatorEscalatorService()
+
+@lru_cache(maxsize=None)
+def _processed_station_names():
+    """
+    Station names for fuzzy lookups, aligned with the service's stations and
+    already lowercased/stripped of punctuation so each query skips that work
+    """
+    return tuple(utils.default_process(s['stop_name']) for s in get_mta_service().stations)
+
+
+@lru_cache(maxsize=None)
+def _processed_station_positions():
+    """Processed station name -> positions in the station list (names repeat, e.g. "86 St")"""
+    positions = defaultdict(list)
+    for i, name in enumerate(_processed_station_names()):
+        positions[name].append(i)
+    return positions
+
+
+# Repeat tool calls with the same arguments within this window reuse the
+# previous result instead of refetching MTA feeds
+TOOL_CACHE_TTL = 30
+TOOL_CACHE_SIZE = 256
+# Results starting with these report a failure; they are not cached, so the
+# next call tries again instead of replaying the error
+_UNCACHED_PREFIXES = ('Error', 'Could not find', 'No stations found')
+# Most fuzzy station suggestions find_nearby_stations lists
+NEARBY_STATIONS_LIMIT = 5
+
+
+def _tool_cache(func):
+    """ttl_cache(TOOL_CACHE_SIZE, TOOL_CACHE_TTL) that leaves failure results uncached"""
+    cache = TTLCache(maxsize=TOOL_CACHE_SIZE, ttl=TOOL_CACHE_TTL)
+    lock = threading.Lock()
+    
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = hashkey(*args, **kwargs)
+        with lock:
+            result = cache.get(key)
+        if result is None:
+            result = func(*args, **kwargs)
+            if not result.startswith(_UNCACHED_PREFIXES):
+                with lock:
+                    cache[key] = result
+        return result
+    
+    return wrapper
+
+
+# Fields of an arrival dict used in the formatted lines, fetched in one call
+_SUBWAY_ARRIVAL_FIELDS = itemgetter('direction', 'arrival_time', 'minutes_away')
+_LIRR_ARRIVAL_FIELDS = itemgetter('destination', 'arrival_time', 'minutes_away', 'track')
 
 
 @tool
+@_tool_cache
 def get_train_arrivals(train_line: str, station_name: str) -> str:
     """
     Get real-time train arrival times for a specific train line at a station.
@@ -28,6 +87,7 @@ def get_train_arrivals(train_line: str, station_name: str) -> str:
     logger.info(f"Tool called: get_train_arrivals({train_line}, {station_name})")
     
     # Find the station
+    mta_service = get_mta_service()
     station = mta_service.find_station(station_name)
     
     if not station:
@@ -43,14 +103,16 @@ def get_train_arrivals(train_line: str, station_name: str) -> str:
         return f"No upcoming {train_line} trains found at {station['stop_name']} in the next 30 minutes."
     
     # Format response
-    result = f"Upcoming {train_line} trains at {station['stop_name']}:\n"
+    parts = [f"Upcoming {train_line} trains at {station['stop_name']}:\n"]
     for i, arrival in enumerate(arrivals, 1):
-        result += f"{i}. {arrival['direction']} - {arrival['arrival_time']} ({arrival['minutes_away']} min)\n"
+        direction, arrival_time, minutes_away = _SUBWAY_ARRIVAL_FIELDS(arrival)
+        parts.append(f"{i}. {direction} - {arrival_time} ({minutes_away} min)\n")
     
-    return result
+    return ''.join(parts)
 
 
 @tool
+@_tool_cache
 def get_service_alerts(train_line: Optional[str] = None) -> str:
     """
     Get service alerts and delays for NYC subway.
@@ -63,7 +125,7 @@ def get_service_alerts(train_line: Optional[str] = None) -> str:
     """
     logger.info(f"Tool called: get_service_alerts({train_line})")
     
-    alerts = mta_service.get_service_alerts(train_line.upper() if train_line else None)
+    alerts = get_mta_service().get_service_alerts(train_line.upper() if train_line else None)
     
     if isinstance(alerts, dict) and 'error' in alerts:
         return f"Error fetching alerts: {alerts['error']}"
@@ -73,17 +135,18 @@ def get_service_alerts(train_line: Optional[str] = None) -> str:
         return f"✓ Good news! No service alerts for {line_text}. Trains are running normally."
     
     # Format alerts
-    result = f"Service Alerts" + (f" for {train_line} line" if train_line else "") + ":\n\n"
+    parts = [f"Service Alerts" + (f" for {train_line} line" if train_line else "") + ":\n\n"]
     for i, alert in enumerate(alerts[:5], 1):
-        result += f"{i}. {alert['header']}\n"
+        parts.append(f"{i}. {alert['header']}\n")
         if alert['affected_routes']:
-            result += f"   Affects: {', '.join(alert['affected_routes'])}\n"
-        result += "\n"
+            parts.append(f"   Affects: {', '.join(alert['affected_routes'])}\n")
+        parts.append("\n")
     
-    return result
+    return ''.join(parts)
 
 
 @tool
+@_tool_cache
 def get_elevator_status(station_name: str) -> str:
     """
     Get elevator and escalator status at a specific station.
@@ -96,7 +159,7 @@ def get_elevator_status(station_name: str) -> str:
     """
     logger.info(f"Tool called: get_elevator_status({station_name})")
     
-    status = elevator_service.get_station_equipment_status(station_name)
+    status = get_elevator_service().get_station_equipment_status(station_name)
     
     if 'error' in status:
         return f"Error checking elevator status: {status['error']}"
@@ -106,25 +169,27 @@ def get_elevator_status(station_name: str) -> str:
         return f"{status['message']}\n\nNote: {status.get('suggestion', 'Some stations do not have elevators or escalators.')}"
     
     # Format status
-    result = f"Elevator/Escalator Status at {status['station']}:\n"
-    result += f"Total Equipment: {status['total_equipment']}\n"
-    result += f"✅ Operational: {status['operational']}\n"
-    result += f"❌ Out of Service: {status['out_of_service']}\n"
+    parts = [
+        f"Elevator/Escalator Status at {status['station']}:\n",
+        f"Total Equipment: {status['total_equipment']}\n",
+        f"✅ Operational: {status['operational']}\n",
+        f"❌ Out of Service: {status['out_of_service']}\n",
+    ]
     
     if status['out_of_service'] == 0:
-        result += "\n✓ All elevators and escalators are operational!"
+        parts.append("\n✓ All elevators and escalators are operational!")
     else:
-        result += "\nDetails:\n"
+        parts.append("\nDetails:\n")
         for equip in status['equipment']:
             if equip['is_out_of_service']:
                 equip_type = "Elevator" if equip['equipment_type'] == 'EL' else "Escalator"
-                result += f"  ❌ {equip_type} - {equip['serving']} (OUT OF SERVICE)\n"
+                parts.append(f"  ❌ {equip_type} - {equip['serving']} (OUT OF SERVICE)\n")
     
-    return result
-
+    return ''.join(parts)
 
 
 @tool
+@_tool_cache
 def find_nearby_stations(station_name: str) -> str:
     """
     Find stations with similar names or nearby the specified station.
@@ -138,31 +203,39 @@ def find_nearby_stations(station_name: str) -> str:
     """
     logger.info(f"Tool called: find_nearby_stations({station_name})")
     
-    from rapidfuzz import fuzz, process
-    
-    station_names = [s['stop_name'] for s in mta_service.stations]
-    
-    # Get top 5 matches
-    matches = process.extract(
-        station_name,
-        station_names,
-        scorer=fuzz.token_sort_ratio,
-        limit=5
-    )
-    
-    if not matches:
+    query = utils.default_process(station_name)
+    
+    # An exact station name answers the question on its own (every station
+    # sharing that name is listed); otherwise get the best fuzzy matches,
+    # whose third element is the position in the station list. WRatio
+    # scores abbreviations like "penn" or "wtc" by their partial match
+    indexes = _processed_station_positions().get(query)
+    if not indexes:
+        matches = process.extract(
+            query,
+            _processed_station_names(),
+            scorer=fuzz.WRatio,
+            limit=NEARBY_STATIONS_LIMIT,
+            score_cutoff=60
+        )
+        indexes = [index for _, _, index in matches]
+    indexes = indexes[:NEARBY_STATIONS_LIMIT]
+    
+    if not indexes:
         return f"No stations found matching '{station_name}'"
     
-    result = f"Stations matching '{station_name}':\n"
-    for i, (name, score, _) in enumerate(matches, 1):
-        # Find station details
-        station = next((s for s in mta_service.stations if s['stop_name'] == name), None)
-        if station:
-            routes = ', '.join(station['routes'][:5])
-            result += f"{i}. {name} ({routes}) - {station['borough']}\n"
+    stations = get_mta_service().stations
+    parts = [f"Stations matching '{station_name}':\n"]
+    for i, index in enumerate(indexes, 1):
+        station = stations[index]
+        routes = ', '.join(station['routes'][:5])
+        parts.append(f"{i}. {station['stop_name']} ({routes}) - {station['borough']}\n")
     
-    return result
+    return ''.join(parts)
+
+
 @tool
+@_tool_cache
 def plan_trip(from_station: str, to_station: str) -> str:
     """
     Plan a trip between two stations. Shows which trains to take and transfer points.
@@ -177,6 +250,7 @@ def plan_trip(from_station: str, to_station: str) -> str:
     logger.info(f"Tool called: plan_trip({from_station}, {to_station})")
     
     # Find both stations
+    mta_service = get_mta_service()
     origin = mta_service.find_station(from_station)
     destination = mta_service.find_station(to_station)
     
@@ -187,148 +261,144 @@ def plan_trip(from_station: str, to_station: str) -> str:
         return f"Could not find destination station: {to_station}. Please check the station name."
     
     # Get routes at each station
-    origin_routes = set(origin['routes'])
-    dest_routes = set(destination['routes'])
+    origin_routes = frozenset(origin['routes'])
+    dest_routes = frozenset(destination['routes'])
     
     # Find direct routes (no transfer needed)
     direct_routes = origin_routes.intersection(dest_routes)
     
-    result = f"Trip from {origin['stop_name']} to {destination['stop_name']}:\n\n"
+    parts = [f"Trip from {origin['stop_name']} to {destination['stop_name']}:\n\n"]
     
     if direct_routes:
-        result += "✅ DIRECT ROUTE (No transfer needed):\n"
-        for route in sorted(direct_routes):
-            result += f"  • Take the {route} train from {origin['stop_name']} to {destination['stop_name']}\n"
+        direct_routes = sorted(direct_routes)
+        parts.append("✅ DIRECT ROUTE (No transfer needed):\n")
+        parts.extend(
+            f"  • Take the {route} train from {origin['stop_name']} to {destination['stop_name']}\n"
+            for route in direct_routes
+        )
         
-        # Get current train times for direct routes
-        result += "\n📍 Current arrivals:\n"
-        for route in sorted(direct_routes):
-            arrivals = mta_service.get_train_arrivals(route, origin)
+        # Get current train times for direct routes (error results are dicts)
+        parts.append("\n📍 Current arrivals:\n")
+        for route, arrivals in mta_service.get_arrivals_for_routes(direct_routes, origin).items():
             if arrivals and not isinstance(arrivals, dict):
-                next_train = arrivals[0] if arrivals else None
-                if next_train:
-                    result += f"  • {route} train: {next_train['minutes_away']} min ({next_train['arrival_time']})\n"
+                next_train = arrivals[0]
+                parts.append(f"  • {route} train: {next_train['minutes_away']} min ({next_train['arrival_time']})\n")
     else:
-        result += "🔄 TRANSFER REQUIRED:\n"
-        result += f"Origin trains: {', '.join(sorted(origin_routes))}\n"
-        result += f"Destination trains: {', '.join(sorted(dest_routes))}\n\n"
+        parts.append("🔄 TRANSFER REQUIRED:\n")
+        parts.append(f"Origin trains: {', '.join(sorted(origin_routes))}\n")
+        parts.append(f"Destination trains: {', '.join(sorted(dest_routes))}\n\n")
         
         # Find common transfer stations
-        transfer_suggestions = find_transfer_stations(origin_routes, dest_routes)
+        transfer_suggestions = find_transfer_stations(origin_routes, dest_routes, limit=3)
         
         if transfer_suggestions:
-            result += "Suggested routes:\n"
-            for i, suggestion in enumerate(transfer_suggestions[:3], 1):
-                result += f"\n{i}. Take {suggestion['from_route']} from {origin['stop_name']}\n"
-                result += f"   Transfer at {suggestion['transfer_station']} to {suggestion['to_route']}\n"
-                result += f"   Continue to {destination['stop_name']}\n"
+            parts.append("Suggested routes:\n")
+            for i, suggestion in enumerate(transfer_suggestions, 1):
+                parts.append(f"\n{i}. Take {suggestion['from_route']} from {origin['stop_name']}\n")
+                parts.append(f"   Transfer at {suggestion['transfer_station']} to {suggestion['to_route']}\n")
+                parts.append(f"   Continue to {destination['stop_name']}\n")
         else:
-            result += "\nRecommended approach:\n"
-            result += f"1. From {origin['stop_name']}, take any of: {', '.join(sorted(origin_routes))}\n"
-            result += f"2. Transfer to a train that serves {destination['stop_name']}: {', '.join(sorted(dest_routes))}\n"
-            result += "\nCommon transfer points: Times Square, Union Square, Atlantic Ave, or Fulton St\n"
+            parts.append("\nRecommended approach:\n")
+            parts.append(f"1. From {origin['stop_name']}, take any of: {', '.join(sorted(origin_routes))}\n")
+            parts.append(f"2. Transfer to a train that serves {destination['stop_name']}: {', '.join(sorted(dest_routes))}\n")
+            parts.append("\nCommon transfer points: Times Square, Union Square, Atlantic Ave, or Fulton St\n")
     
-    return result
+    return ''.join(parts)
 
 
-def find_transfer_stations(origin_routes: set, dest_routes: set) -> list:
+# Major transfer hubs with their routes
+TRANSFER_HUBS = (
+    ('Times Sq-42 St', frozenset(['1', '2', '3', '7', 'N', 'Q', 'R', 'W', 'S'])),
+    ('14 St-Union Sq', frozenset(['4', '5', '6', 'L', 'N', 'Q', 'R', 'W'])),
+    ('Atlantic Ave-Barclays Ctr', frozenset(['2', '3', '4', '5', 'B', 'D', 'N', 'Q', 'R'])),
+    ('Fulton St', frozenset(['2', '3', '4', '5', 'A', 'C', 'J', 'Z'])),
+    ('59 St-Columbus Circle', frozenset(['1', 'A', 'B', 'C', 'D'])),
+    ('Jay St-MetroTech', frozenset(['A', 'C', 'F', 'R'])),
+    ('Lexington Ave/59 St', frozenset(['4', '5', '6', 'N', 'Q', 'R', 'W'])),
+    ('Herald Sq', frozenset(['B', 'D', 'F', 'M', 'N', 'Q', 'R', 'W'])),
+)
+
+
+@lru_cache(maxsize=512)
+def find_transfer_stations(origin_routes: frozenset, dest_routes: frozenset, limit: Optional[int] = None) -> tuple:
     """
     Find stations where you can transfer between route sets
+    Memoized, since agents re-plan the same popular trips
     
     Args:
-        origin_routes: Set of routes at origin
-        dest_routes: Set of routes at destination
+        origin_routes: Routes at origin
+        dest_routes: Routes at destination
+        limit: Stop after this many suggestions (all when None)
     
     Returns:
-        List of transfer suggestions
+        Tuple of transfer suggestions (shared between calls - do not modify)
     """
-    # Major transfer hubs with their routes
-    transfer_hubs = {
-        'Times Sq-42 St': ['1', '2', '3', '7', 'N', 'Q', 'R', 'W', 'S'],
-        '14 St-Union Sq': ['4', '5', '6', 'L', 'N', 'Q', 'R', 'W'],
-        'Atlantic Ave-Barclays Ctr': ['2', '3', '4', '5', 'B', 'D', 'N', 'Q', 'R'],
-        'Fulton St': ['2', '3', '4', '5', 'A', 'C', 'J', 'Z'],
-        '59 St-Columbus Circle': ['1', 'A', 'B', 'C', 'D'],
-        'Jay St-MetroTech': ['A', 'C', 'F', 'R'],
-        'Lexington Ave/59 St': ['4', '5', '6', 'N', 'Q', 'R', 'W'],
-        'Herald Sq': ['B', 'D', 'F', 'M', 'N', 'Q', 'R', 'W'],
-    }
-    
-    suggestions = []
-    
-    for station, routes in transfer_hubs.items():
-        station_routes = set(routes)
-        
+    suggestions = (
+        {
+            'transfer_station': station,
+            'from_route': from_route,
+            'to_route': to_route
+        }
+        for station, station_routes in TRANSFER_HUBS
         # Check if this hub connects origin and destination routes
-        origin_match = origin_routes.intersection(station_routes)
-        dest_match = dest_routes.intersection(station_routes)
-        
-        if origin_match and dest_match:
-            for from_route in origin_match:
-                for to_route in dest_match:
-                    if from_route != to_route:
-                        suggestions.append({
-                            'transfer_station': station,
-                            'from_route': from_route,
-                            'to_route': to_route
-                        })
+        for from_route, to_route in product(
+            sorted(station_routes.intersection(origin_routes)),
+            sorted(station_routes.intersection(dest_routes))
+        )
+        if from_route != to_route
+    )
     
-    return suggestions
-
-# Import LIRR tool functions directly
-from services.lirr_service import LIRRService
-
-lirr_service = LIRRService()
+    return tuple(islice(suggestions, limit))
 
 @tool
+@_tool_cache
 def get_lirr_train_arrivals_func(station_name: str) -> str:
     """Get LIRR train arrivals"""
     try:
         logger.info(f"LIRR Tool called: get_lirr_train_arrivals({station_name})")
         
-        arrivals = lirr_service.get_train_arrivals(station_name)
-        
-        if isinstance(arrivals, dict) and 'error' in arrivals:
-            return f"Error: {arrivals['error']}"
+        arrivals = get_lirr_service().get_train_arrivals(station_name)
         
         if not arrivals:
             return f"No upcoming LIRR trains found at {station_name}"
         
-        station = lirr_service.find_station(station_name)
-        station_display = station['name'] if station else station_name
+        station = get_lirr_service().find_station(station_name)
+        station_display = station.name if station else station_name
         
-        result = f"Upcoming LIRR trains at {station_display}:\n\n"
+        parts = [f"Upcoming LIRR trains at {station_display}:\n\n"]
         for i, arrival in enumerate(arrivals, 1):
-            track_info = f"Track {arrival['track']}" if arrival['track'] != 'TBD' else "Track TBD"
-            result += f"{i}. To {arrival['destination']} - {arrival['arrival_time']} ({arrival['minutes_away']} min) - {track_info}\n"
+            destination, arrival_time, minutes_away, track = _LIRR_ARRIVAL_FIELDS(arrival)
+            parts.append(f"{i}. To {destination} - {arrival_time} ({minutes_away} min) - Track {track}\n")
         
-        return result
+        return ''.join(parts)
+    except LIRRError as e:
+        return f"Error: {e}"
     except Exception as e:
         return f"Error: {str(e)}"
 
 
 @tool
+@_tool_cache
 def get_lirr_service_alerts_func(input_str: str = "") -> str:
     """Get LIRR service alerts"""
     try:
         logger.info("LIRR Tool called: get_lirr_service_alerts()")
         
-        alerts = lirr_service.get_service_alerts()
-        
-        if isinstance(alerts, dict) and 'error' in alerts:
-            return f"Error: {alerts['error']}"
+        alerts = get_lirr_service().get_service_alerts()
         
         if not alerts:
             return "✓ No LIRR service alerts. Trains running on schedule!"
         
-        result = f"LIRR Service Alerts ({len(alerts)} active):\n\n"
+        parts = [f"LIRR Service Alerts ({len(alerts)} active):\n\n"]
         for i, alert in enumerate(alerts[:5], 1):
-            result += f"{i}. {alert['header']}\n"
+            parts.append(f"{i}. {alert['header']}\n")
             if alert['affected_lines']:
-                result += f"   Affected: {', '.join(alert['affected_lines'])}\n"
-            result += "\n"
+                parts.append(f"   Affected: {', '.join(alert['affected_lines'])}\n")
+            parts.append("\n")
         
-        return result
+        return ''.join(parts)
+    except LIRRError as e:
+        return f"Error: {e}"
     except Exception as e:
         return f"Error: {str(e)}"
 
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('langchain')
+
+from services.gemini_service_langchain import _fast_route
+
+TOOLS = [SimpleNamespace(name=name) for name in
+         ('get_train_arrivals', 'get_elevator_status', 'get_service_alerts')]
+
+
+def route(query):
+    result = _fast_route(query, TOOLS)
+    return result and (result[0].name, result[1])
+
+
+def test_article_is_not_the_a_line():
+    assert route("When is there a train at Union Square?") is None
+
+
+def test_article_is_not_the_a_line_for_alerts():
+    assert route("Are there delays on a train line right now?") is None
+
+
+def test_station_stops_at_direction_word():
+    assert route("next 6 train from Times Sq to Brooklyn") == (
+        'get_train_arrivals', {'train_line': '6', 'station_name': 'Times Sq'})
+
+
+def test_explicit_lines():
+    assert route("When is the next A train at 14 St?") == (
+        'get_train_arrivals', {'train_line': 'A', 'station_name': '14 St'})
+    assert route("when is the a train at Canal St") == (
+        'get_train_arrivals', {'train_line': 'A', 'station_name': 'Canal St'})
+    assert route("Any delays on the L train?") == (
+        'get_service_alerts', {'train_line': 'L'})
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+pytest.importorskip('google.transit')
+
+from services.mta_service import MTAService
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def mta():
+    # Station data is loaded from paths relative to the repo root
+    cwd = os.getcwd()
+    os.chdir(REPO_ROOT)
+    try:
+        yield MTAService()
+    finally:
+        os.chdir(cwd)
+
+
+def name(mta, query):
+    station = mta.find_station(query)
+    return station and station['stop_name']
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('8 ave', '8 Av'),
+    ('mott ave', 'Far Rockaway-Mott Av'),
+    ('nostrand', 'Nostrand Av'),
+    ('parsons', 'Parsons Blvd'),
+])
+def test_partial_names(mta, query, expected):
+    assert name(mta, query) == expected
+
+
+@pytest.mark.parametrize('query', ['8 ave', '6 ave', '5th ave', 'lex ave 59', '2nd ave'])
+def test_numbered_avenues_are_not_lettered_avenues(mta, query):
+    assert name(mta, query) not in ('Avenue H', 'Avenue M', 'Avenue N')
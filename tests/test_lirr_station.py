@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip('google.transit')
+
+from services.lirr_service import LIRRService
+
+
+@pytest.fixture(scope='module')
+def lirr():
+    return LIRRService()
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('hicks', 'Hicksville'),
+    ('ronk', 'Ronkonkoma'),
+    ('port jeff', 'Port Jefferson'),
+    ('penn', 'Penn Station'),
+    ('Jamaica Station', 'Jamaica'),
+    ('hicksvile', 'Hicksville'),
+])
+def test_find_station(lirr, query, expected):
+    station = lirr.find_station(query)
+    assert station is not None and station.name == expected
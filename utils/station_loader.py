@@ -0,0 +1,130 @@
+import gzip
+import os
+import re
+from functools import lru_cache
+from operator import itemgetter
+from sys import intern
+
+import orjson
+import requests
+
+# NY Open Data (Socrata) JSON endpoint - records arrive already keyed by
+# field name, so there is no CSV to parse
+DATASET_URL = "https://data.ny.gov/resource/39hk-dx4f.json"
+DATASET_PARAMS = {'$limit': 10000}
+
+OUTPUT_FILE = 'data/subway_stations.json'
+ETAG_FILE = 'data/.mta_stations.etag'
+RAW_FILE = 'data/.mta_stations.raw'
+
+# Route lists come as "A C E" or "1-2-3"; route and borough strings are
+# interned so every station shares the same few str objects
+_ROUTE_SPLIT = re.compile(r'[-\s]+')
+
+
+@lru_cache(maxsize=1)
+def fetch_raw():
+    """
+    Download the raw dataset once per process, reusing the cached copy on
+    disk when the server answers 304 Not Modified for our stored ETag
+    """
+    # Ask for a compressed body explicitly - the JSON shrinks ~10x
+    headers = {'Accept-Encoding': 'gzip, deflate'}
+    if os.path.exists(ETAG_FILE) and os.path.exists(RAW_FILE):
+        with open(ETAG_FILE) as f:
+            headers['If-None-Match'] = f.read().strip()
+
+    response = requests.get(DATASET_URL, params=DATASET_PARAMS, headers=headers, timeout=30)
+    if response.status_code == 304:
+        print("✓ Dataset unchanged since last download, using cached copy")
+        with open(RAW_FILE, 'rb') as f:
+            return f.read()
+    response.raise_for_status()
+
+    etag = response.headers.get('ETag')
+    if etag:
+        os.makedirs('data', exist_ok=True)
+        with open(RAW_FILE, 'wb') as f:
+            f.write(response.content)
+        with open(ETAG_FILE, 'w') as f:
+            f.write(etag)
+    return response.content
+
+
+@lru_cache(maxsize=1)
+def parse():
+    """
+    Convert the raw dataset into our station format, one entry per station
+    complex, sorted by stop name
+    """
+    records = orjson.loads(fetch_raw())
+    stations_dict = {}  # Use dict to avoid duplicates
+
+    for record in records:
+        # Extract key fields
+        stop_id = record.get('gtfs_stop_id', '').strip()
+        stop_name = record.get('stop_name', '').strip()
+
+        if not stop_id or not stop_name:
+            continue
+
+        # Get coordinates
+        try:
+            lat = float(record.get('gtfs_latitude', 0))
+            lon = float(record.get('gtfs_longitude', 0))
+        except (ValueError, TypeError):
+            lat, lon = 0.0, 0.0
+
+        routes = [intern(r) for r in _ROUTE_SPLIT.split(record.get('daytime_routes', '')) if r]
+        borough = intern(record.get('borough', '').strip())
+
+        # Group by complex to consolidate stations
+        complex_id = record.get('complex_id') or stop_id
+
+        if complex_id not in stations_dict:
+            # Generate GTFS stop IDs (with N/S suffixes for direction)
+            if stop_id[-1:] in ('N', 'S'):
+                gtfs_stop_ids = [stop_id]
+            else:
+                gtfs_stop_ids = [stop_id, stop_id + 'N', stop_id + 'S']
+
+            stations_dict[complex_id] = {
+                "stop_id": stop_id,
+                "stop_name": stop_name,
+                "stop_lat": lat,
+                "stop_lon": lon,
+                "routes": set(routes),
+                "borough": borough,
+                "gtfs_stop_ids": gtfs_stop_ids
+            }
+        else:
+            # Merge routes if station already exists
+            stations_dict[complex_id]['routes'].update(routes)
+
+    # Routes were collected as sets; store them as sorted lists
+    for station in stations_dict.values():
+        station['routes'] = sorted(station['routes'])
+
+    return sorted(stations_dict.values(), key=itemgetter('stop_name'))
+
+
+def save_stations(output_data, output_file=OUTPUT_FILE):
+    """
+    Write the station data as pretty-printed JSON, a compact gzip copy
+    (which MTAService prefers), JSON Lines and a metadata sidecar
+    """
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+    with open(output_file, 'wb', buffering=65536) as f:
+        f.write(orjson.dumps(output_data, option=orjson.OPT_INDENT_2))
+    with gzip.open(output_file + '.gz', 'wb', compresslevel=6) as f:
+        f.write(orjson.dumps(output_data))
+
+    # One station per line so consumers can stream without loading the array
+    base = output_file[:-len('.json')]
+    with open(base + '.jsonl', 'wb', buffering=65536) as f:
+        for station in output_data['stations']:
+            f.write(orjson.dumps(station))
+            f.write(b'\n')
+    with open(base + '.meta.json', 'wb') as f:
+        f.write(orjson.dumps(output_data['metadata'], option=orjson.OPT_INDENT_2))